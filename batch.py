@@ -0,0 +1,130 @@
+from __future__ import annotations
+import sys
+import json
+import time
+import asyncio
+import argparse
+import response_cache
+import tracing
+from main import API_KEY, genai, types, get_config, run_agent_loop_async
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run many agent sessions concurrently from a JSONL file of prompts.",
+        epilog='Each input line is a JSON object such as {"id": "fix-tests", "prompt": "Fix the failing tests"}.',
+    )
+    parser.add_argument("input", help="JSONL file with one prompt object per line")
+    parser.add_argument("output", help="JSONL file that receives one result object per session")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of sessions running at once (default: 4)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache even if RESPONSE_CACHE=true")
+    parser.add_argument("--trace", action="store_true", help="Record timing spans to TRACE_FILE (default: trace.jsonl) and print a summary")
+    parser.add_argument("--verbose", action="store_true", help="Print model and function call details for every session")
+    return parser.parse_args()
+
+
+def read_prompts(input_path: str) -> list[dict]:
+    '''
+    Reads prompt objects from a JSONL file. Blank lines are skipped and a missing "id" defaults to the line number.
+
+    Args:
+        input_path: Path to the JSONL file.
+    Returns:
+        List of dictionaries with "id" and "prompt" keys.
+    '''
+    prompts = []
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not record.get("prompt"):
+                raise ValueError(f'Line {line_number} of "{input_path}" has no "prompt" value')
+            prompts.append({"id": record.get("id", line_number), "prompt": record["prompt"]})
+    return prompts
+
+
+async def run_session(
+    client: genai.Client,
+    config: types.GenerateContentConfig,
+    record: dict,
+    is_verbose: bool,
+    semaphore: asyncio.Semaphore,
+) -> dict:
+    '''
+    Runs one agent session for a prompt record once a concurrency slot is free.
+
+    Args:
+        client: Shared Gemini client
+        config: Shared model configuration (function declarations and system prompt)
+        record: Prompt object with "id" and "prompt" keys
+        is_verbose: Optional console argument
+        semaphore: Limits the number of sessions running at once
+    Returns:
+        Result object with the final response, token usage, and timing for the session.
+    '''
+    async with semaphore:
+        session_stats = {"iterations": 0, "requests": 0, "prompt_tokens": 0, "response_tokens": 0}
+        conversation_history = [types.Content(
+            role="user",
+            parts=[types.Part(text=record["prompt"])],
+        )]
+        start = time.perf_counter()
+        final_response = await run_agent_loop_async(
+            client, config, conversation_history, record["prompt"], is_verbose, session_stats
+        )
+        return {
+            "id": record["id"],
+            "prompt": record["prompt"],
+            "final_response": final_response,
+            "completed": final_response is not None,
+            "elapsed_seconds": round(time.perf_counter() - start, 3),
+            **session_stats,
+        }
+
+
+async def run_batch(input_path: str, output_path: str, concurrency: int, is_verbose: bool) -> None:
+    '''
+    Runs every prompt in the input file and streams results to the output file as sessions finish.
+    Configuration, the Gemini client, and the tool registry are set up once and shared by all sessions.
+
+    Args:
+        input_path: JSONL file of prompt objects.
+        output_path: JSONL file for result objects (written in completion order).
+        concurrency: Maximum number of sessions running at once.
+        is_verbose: Optional console argument
+    '''
+    prompts = read_prompts(input_path)
+    client = genai.Client(api_key=API_KEY)
+    config = get_config()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    sessions = [run_session(client, config, record, is_verbose, semaphore) for record in prompts]
+    completed = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        for session in asyncio.as_completed(sessions):
+            result = await session
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            completed += 1
+            print(f"[{completed}/{len(prompts)}] Session {result['id']} finished "
+                  f"(completed={result['completed']}, requests={result['requests']})")
+
+
+def main():
+    args = parse_args()
+    if args.no_cache:
+        response_cache.set_enabled(False)
+    if args.trace:
+        tracing.enable()
+    try:
+        asyncio.run(run_batch(args.input, args.output, args.concurrency, args.verbose))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if tracing.is_enabled():
+        tracing.print_summary()
+
+
+if __name__ == "__main__":
+    main()
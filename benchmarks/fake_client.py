@@ -0,0 +1,115 @@
+import time
+import asyncio
+from google.genai import types
+from token_estimator import estimate_prompt_tokens
+
+
+def scripted_response(turn: list[dict], prompt_tokens: int) -> types.GenerateContentResponse:
+    '''
+    Builds a model response from one scripted turn. The stand-ins report the uncalibrated local estimate as the
+    prompt token count, in place of the real tokenizer.
+
+    Args:
+        turn: List of parts, each {"text": ...} or {"function_call": {"name": ..., "args": {...}}}
+        prompt_tokens: Prompt token count to report in the usage metadata
+    Returns:
+        Response object shaped like a real Gemini response.
+    '''
+    parts = []
+    for part in turn:
+        if "function_call" in part:
+            call = part["function_call"]
+            parts.append(types.Part(function_call=types.FunctionCall(name=call["name"], args=call.get("args", {}))))
+        else:
+            parts.append(types.Part(text=part["text"]))
+    response_tokens = sum(len(str(part)) for part in turn) // 4
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=parts))],
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=response_tokens,
+        ),
+    )
+
+
+class FakeModels:
+    '''
+    Local stand-in for client.models that replays a recorded sequence of model turns instead of calling the API.
+    Each call returns the next turn; once the script is used up, the last turn is repeated.
+    '''
+
+    def __init__(self, turns: list[list[dict]], latency: float=0.0):
+        self.turns = turns
+        self.latency = latency # simulated model latency in seconds
+        self.calls = 0
+
+    def _next_turn(self) -> list[dict]:
+        turn = self.turns[min(self.calls, len(self.turns) - 1)]
+        self.calls += 1
+        return turn
+
+    def generate_content(self, model: str, config: types.GenerateContentConfig, contents: list[types.Content]):
+        if self.latency:
+            time.sleep(self.latency)
+        return scripted_response(self._next_turn(), estimate_prompt_tokens(contents, config, calibrated=False))
+
+    def generate_content_stream(self, model: str, config: types.GenerateContentConfig, contents: list[types.Content]):
+        """Yields one chunk per scripted part; the last chunk carries the usage metadata, as in the real API."""
+        chunks = self._next_chunks(config, contents)
+        for chunk in chunks:
+            if self.latency:
+                time.sleep(self.latency / len(chunks))
+            yield chunk
+
+    def _next_chunks(self, config: types.GenerateContentConfig, contents: list[types.Content]) -> list:
+        response = scripted_response(self._next_turn(), estimate_prompt_tokens(contents, config, calibrated=False))
+        parts = response.candidates[0].content.parts
+        return [
+            types.GenerateContentResponse(
+                candidates=[types.Candidate(content=types.Content(role="model", parts=[part]))],
+                usage_metadata=response.usage_metadata if index == len(parts) - 1 else None,
+            )
+            for index, part in enumerate(parts)
+        ]
+
+
+class FakeAsyncModels:
+    """Async counterpart of FakeModels for client.aio.models."""
+
+    def __init__(self, models: FakeModels):
+        self._models = models
+
+    async def generate_content(self, model: str, config: types.GenerateContentConfig, contents: list[types.Content]):
+        if self._models.latency:
+            await asyncio.sleep(self._models.latency)
+        return scripted_response(self._models._next_turn(), estimate_prompt_tokens(contents, config, calibrated=False))
+
+    async def generate_content_stream(self, model: str, config: types.GenerateContentConfig, contents: list[types.Content]):
+        """Returns an async iterator over the same chunks as FakeModels.generate_content_stream."""
+        chunks = self._models._next_chunks(config, contents)
+        latency = self._models.latency
+
+        async def stream():
+            for chunk in chunks:
+                if latency:
+                    await asyncio.sleep(latency / len(chunks))
+                yield chunk
+        return stream()
+
+
+class FakeAio:
+    def __init__(self, models: FakeModels):
+        self.models = FakeAsyncModels(models)
+
+
+class FakeClient:
+    '''
+    Drop-in replacement for genai.Client in run_agent_loop and run_agent_loop_async.
+
+    Example:
+        client = FakeClient([[{"function_call": {"name": "get_files_info", "args": {}}}], [{"text": "Done"}]])
+    '''
+
+    def __init__(self, turns: list[list[dict]], latency: float=0.0):
+        self.models = FakeModels(turns, latency)
+        self.aio = FakeAio(self.models)
@@ -0,0 +1,224 @@
+"""
+Runs the agent loop end to end against a scripted local model (benchmarks/fake_client.py) and a fresh copy of the
+calculator/ workspace, then reports wall time, tool time, bytes read and written, and history size per scenario.
+Tool and subprocess times are summed over calls, so they can exceed the wall time when calls run concurrently.
+No API requests are made and the real quota log is not touched, so results can be compared across commits.
+
+Usage: python -m benchmarks.run_benchmarks [--scenario NAME] [--repeat N] [--stream] [--async] [--latency S] [--json PATH]
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import statistics
+import contextlib
+
+# The agent reads these at import time; benchmarks use fixed values so runs are comparable
+os.environ.setdefault("MAX_CHAR_LIMIT", "10000")
+os.environ.setdefault("MAX_ITERATIONS", "10")
+os.environ.setdefault("AI_MODEL", "benchmark")
+
+from google.genai import types
+import main
+import tracing
+import quota_tracker
+import quota_scheduler
+import response_cache
+import token_estimator
+import functions.call_function as call_function
+import functions.search_files as search_files
+from functions.utils import root_dir
+from functions.tool_cache import tool_cache
+from benchmarks.fake_client import FakeClient
+
+
+SCENARIOS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios.json")
+FIXTURE_DIR = "calculator"
+BENCHMARK_DIR = os.path.join(".cache", "benchmarks") # relative to the root directory
+
+# Metrics reported as the median over repeats; the others are identical in every repeat
+timed_metrics = ["wall_ms", "model_ms", "tool_ms", "subprocess_ms", "quota_ms"]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the agent loop offline with a scripted model.")
+    parser.add_argument("--scenario", action="append", help="Scenario to run (repeatable; default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario; timings are medians (default: 3)")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming loop (is_streaming)")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Use run_agent_loop_async")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated model latency per call in seconds (default: 0)")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    return parser.parse_args()
+
+
+def isolate_quota() -> None:
+    '''
+    Points quota tracking and token calibration at scratch files and lifts the limits, so bookkeeping runs but never
+    waits or fails.
+    '''
+    log_file = os.path.join(root_dir(), BENCHMARK_DIR, "quota_log.jsonl")
+    for path in (log_file, f"{log_file}.lock"):
+        if os.path.exists(path):
+            os.remove(path)
+    quota_tracker.LOG_FILE = log_file
+    quota_tracker.LOCK_FILE = f"{log_file}.lock"
+    quota_scheduler.threshold_rpd = lambda: 10**9
+    quota_scheduler.threshold_rpm = lambda: 10**9
+    quota_scheduler.threshold_tpm = lambda: 10**12
+    response_cache.set_enabled(False)
+    token_estimator.TOKEN_CALIBRATION_FILE = os.path.join(root_dir(), BENCHMARK_DIR, "token_calibration.json")
+    token_estimator._factor = 1.0
+
+
+def prepare_workspace(name: str) -> str:
+    """Copy the fixture workspace to a scratch directory and return its path relative to the root directory."""
+    workspace = os.path.join(BENCHMARK_DIR, name)
+    full_path = os.path.join(root_dir(), workspace)
+    shutil.rmtree(full_path, ignore_errors=True)
+    shutil.copytree(os.path.join(root_dir(), FIXTURE_DIR), full_path, ignore=shutil.ignore_patterns("__pycache__"))
+    # Start every run with a cold tool cache and search index (the copy keeps file times, so old entries would match)
+    tool_cache.clear()
+    index = search_files.get_index(os.path.abspath(full_path))
+    if os.path.exists(index.index_path):
+        os.remove(index.index_path)
+    search_files._indexes.pop(index.base_path, None)
+    return workspace
+
+
+def summarize_trace(trace_file: str) -> dict:
+    """Total the durations and byte counts of the spans recorded during one run."""
+    totals = {"model_ms": 0.0, "tool_ms": 0.0, "subprocess_ms": 0.0, "quota_ms": 0.0, "bytes_read": 0, "bytes_written": 0}
+    with open(trace_file, "r", encoding="utf-8") as f:
+        for line in f:
+            event = json.loads(line)
+            name = event["name"]
+            if name.startswith("model."):
+                totals["model_ms"] += event["duration_ms"]
+            elif name.startswith("tool."):
+                totals["tool_ms"] += event["duration_ms"]
+            elif name == "subprocess.run":
+                totals["subprocess_ms"] += event["duration_ms"]
+            elif name.startswith("quota."):
+                totals["quota_ms"] += event["duration_ms"]
+            elif name == "io.read_file":
+                totals["bytes_read"] += event.get("bytes", 0)
+            elif name == "io.read_lines":
+                totals["bytes_read"] += event.get("characters", 0)
+            elif name == "io.write_file":
+                totals["bytes_written"] += event.get("characters", 0)
+    return totals
+
+
+def run_scenario(name: str, scenario: dict, is_streaming: bool, use_async: bool, latency: float) -> dict:
+    '''
+    Runs one scenario end to end and measures it.
+
+    Args:
+        name: Scenario name
+        scenario: {"description": ..., "turns": [...]} as in scenarios.json
+        is_streaming: Use the streaming loop
+        use_async: Use run_agent_loop_async
+        latency: Simulated model latency per call in seconds
+    Returns:
+        Dictionary of metrics for the run.
+    '''
+    workspace = prepare_workspace(name)
+    trace_file = os.path.join(root_dir(), BENCHMARK_DIR, f"{name}.trace.jsonl")
+    if os.path.exists(trace_file):
+        os.remove(trace_file)
+
+    call_function.WORKING_DIR = workspace
+    main.MAX_ITERATIONS = len(scenario["turns"])
+    tracing.enable(trace_file)
+    client = FakeClient(scenario["turns"], latency)
+    config = main.get_config()
+    user_prompt = scenario["description"]
+    conversation_history = [types.Content(role="user", parts=[types.Part(text=user_prompt)])]
+    session_stats = {}
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if use_async:
+            final_response = asyncio.run(main.run_agent_loop_async(
+                client, config, conversation_history, user_prompt, False, session_stats, is_streaming
+            ))
+        else:
+            final_response = main.run_agent_loop(
+                client, config, conversation_history, user_prompt, False, session_stats, is_streaming
+            )
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    result = {
+        "scenario": name,
+        "completed": final_response is not None,
+        "iterations": session_stats.get("iterations", 0),
+        "wall_ms": wall_ms,
+        **summarize_trace(trace_file),
+        "history_contents": len(conversation_history),
+        "history_chars": sum(len(content.model_dump_json(exclude_none=True)) for content in conversation_history),
+        "history_tokens": token_estimator.estimate_prompt_tokens(conversation_history),
+    }
+    if "error" in session_stats:
+        result["error"] = session_stats["error"]
+    shutil.rmtree(os.path.join(root_dir(), workspace), ignore_errors=True)
+    os.remove(trace_file)
+    return result
+
+
+def median_result(runs: list[dict]) -> dict:
+    """Combine repeated runs of a scenario, taking the median of each timing."""
+    result = dict(runs[-1])
+    for metric in timed_metrics:
+        result[metric] = statistics.median(run[metric] for run in runs)
+    result["repeats"] = len(runs)
+    return result
+
+
+def print_results(results: list[dict]) -> None:
+    print(
+        f"{'scenario':<16} {'iters':>5} {'wall ms':>9} {'model ms':>9} {'tool ms':>9} {'subproc ms':>10} "
+        f"{'quota ms':>9} {'read B':>8} {'written B':>9} {'history':>7} {'hist tok':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['scenario']:<16} {result['iterations']:>5} {result['wall_ms']:>9.1f} {result['model_ms']:>9.1f} "
+            f"{result['tool_ms']:>9.1f} {result['subprocess_ms']:>10.1f} {result['quota_ms']:>9.1f} "
+            f"{result['bytes_read']:>8} {result['bytes_written']:>9} {result['history_contents']:>7} "
+            f"{result['history_tokens']:>8}"
+        )
+        if not result["completed"]:
+            print(f"  ! {result['scenario']} did not complete: {result.get('error', 'no final response')}")
+
+
+def main_benchmark():
+    args = parse_args()
+    with open(SCENARIOS_FILE, "r", encoding="utf-8") as f:
+        scenarios = json.load(f)
+    names = args.scenario or list(scenarios)
+    unknown = [name for name in names if name not in scenarios]
+    if unknown:
+        print(f"Error: Unknown scenario(s): {', '.join(unknown)}; available: {', '.join(scenarios)}")
+        sys.exit(1)
+
+    os.makedirs(os.path.join(root_dir(), BENCHMARK_DIR), exist_ok=True)
+    isolate_quota()
+    results = []
+    for name in names:
+        runs = [
+            run_scenario(name, scenarios[name], args.stream, args.use_async, args.latency)
+            for _ in range(max(1, args.repeat))
+        ]
+        results.append(median_result(runs))
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_benchmark()
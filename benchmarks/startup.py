@@ -0,0 +1,74 @@
+"""
+Measures agent startup in fresh interpreters and checks it against a time budget.
+Each phase runs --repeat times in a new process and the median wall time is reported; the script exits with
+status 1 when a budgeted phase is over budget, so it can guard against startup regressions.
+
+Usage: python -m benchmarks.startup [--repeat N] [--budget-ms MS]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from functions.utils import root_dir
+
+
+# Phase name -> (command arguments after the interpreter, budgeted?)
+phases = {
+    "interpreter": (["-c", "pass"], False),
+    "import main": (["-c", "import main"], True),
+    "usage error": (["main.py"], True),
+    "config + tool schemas (SDK loaded)": (["-c", "import main; main.get_config()"], False),
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Measure agent startup time against a budget.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per phase; the median is reported (default: 5)")
+    parser.add_argument(
+        "--budget-ms", type=float, default=250.0,
+        help="Budget for the phases that do not need the Gemini SDK (default: 250)",
+    )
+    return parser.parse_args()
+
+
+def measure(arguments: list[str], repeat: int) -> float:
+    """Return the median wall time in milliseconds of running the interpreter with arguments."""
+    env = dict(os.environ)
+    # Settings required at import time; values do not affect startup cost
+    env.setdefault("MAX_CHAR_LIMIT", "1000")
+    env.setdefault("MAX_ITERATIONS", "5")
+    durations = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *arguments],
+            cwd=root_dir(),
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def main():
+    args = parse_args()
+    over_budget = []
+    print(f"{'phase':<36} {'median ms':>10}  budget")
+    for name, (arguments, budgeted) in phases.items():
+        duration = measure(arguments, args.repeat)
+        budget = f"{args.budget_ms:.0f} ms" if budgeted else "-"
+        if budgeted and duration > args.budget_ms:
+            over_budget.append(name)
+            budget += " (over)"
+        print(f"{name:<36} {duration:>10.1f}  {budget}")
+
+    if over_budget:
+        print(f"Startup budget exceeded: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
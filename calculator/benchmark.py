@@ -0,0 +1,89 @@
+# benchmark.py
+
+import sys
+import time
+import random
+from collections import deque
+from pkg.calculator import Calculator, np, tokenize
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def long_expression(terms, separator):
+    # About 10 tokens per term, mixing decimals, scientific notation, unary minus, names, and parentheses
+    generator = random.Random(0)
+    parts = []
+    for index in range(terms):
+        if index:
+            parts.append(generator.choice("+-"))
+        parts.extend([
+            "(", "{:.2f}".format(generator.uniform(1, 100)), "*", "x", "-",
+            "{}e-3".format(generator.randint(1, 999)), ")", "/", "-", str(generator.randint(1, 9)),
+        ])
+    return separator.join(parts)
+
+
+def benchmark_compile(tokens):
+    calculator = Calculator()
+    for name, separator in (("unspaced", ""), ("spaced", " ")):
+        expression = long_expression(max(1, tokens // 10), separator)
+        count = sum(1 for _ in tokenize(expression))
+        print("Compiling an expression of {} tokens ({}, {} characters)".format(count, name, len(expression)))
+        _, elapsed = timed(lambda: deque(tokenize(expression), maxlen=0))
+        print("{:<22} {:>9.3f} s {:>12.0f} tokens/s".format("tokenize", elapsed, count / elapsed))
+        program, elapsed = timed(lambda: calculator._compile(expression))  # Bypasses the program cache
+        print("{:<22} {:>9.3f} s {:>12.0f} tokens/s".format("compile", elapsed, count / elapsed))
+        _, elapsed = timed(lambda: program.run({"x": 1.5}))
+        print("{:<22} {:>9.3f} s {:>12.0f} tokens/s".format("run", elapsed, count / elapsed))
+
+
+def benchmark_columns(rows):
+    expression = "price * quantity - discount / ( quantity + 1 )"
+    calculator = Calculator()
+    generator = random.Random(0)
+    columns = {
+        "price": [generator.uniform(1, 100) for _ in range(rows)],
+        "quantity": [float(generator.randint(1, 20)) for _ in range(rows)],
+        "discount": [generator.uniform(0, 10) for _ in range(rows)],
+    }
+    print("Evaluating {!r} over {} rows".format(expression, rows))
+
+    def per_row():
+        names = list(columns)
+        return [
+            calculator.evaluate(expression, dict(zip(names, values)))
+            for values in zip(*columns.values())
+        ]
+
+    expected, baseline = timed(per_row)
+    print("{:<22} {:>9.3f} s {:>12.0f} rows/s".format("evaluate per row", baseline, rows / baseline))
+
+    modes = [("columns (lists)", False)]
+    if np is not None:
+        modes.append(("columns (NumPy)", True))
+    else:
+        print("NumPy is not installed; skipping the NumPy mode")
+    for name, use_numpy in modes:
+        result, elapsed = timed(lambda: calculator.evaluate_columns(expression, columns, use_numpy))
+        if any(abs(a - b) > 1e-9 * max(1.0, abs(b)) for a, b in zip(result, expected)):
+            print("{}: results differ from evaluate".format(name))
+        print("{:<22} {:>9.3f} s {:>12.0f} rows/s  ({:.1f}x)".format(
+            name, elapsed, rows / elapsed, baseline / elapsed
+        ))
+
+
+def main():
+    # Usage: python benchmark.py [rows] [tokens]
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    tokens = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    benchmark_columns(rows)
+    print()
+    benchmark_compile(tokens)
+
+
+if __name__ == "__main__":
+    main()
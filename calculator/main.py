@@ -1,26 +1,85 @@
 # main.py
 
 import sys
+import json
 from pkg.calculator import Calculator
-from pkg.render import render
+from pkg.render import render, format_number
 
 
-def main():
+def print_usage():
+    print("Calculator App")
+    print('Usage: python main.py "<expression>" [--compact | --json]')
+    print("       python main.py --stdin [--compact | --json]")
+    print("       python main.py --file <path> [--compact | --json]")
+    print('Example: python main.py "3 + 5"')
+    print('Example: printf "3 + 5\\n2 * 4\\n" | python main.py --stdin --compact')
+
+
+def format_line(expression, result, error, output_format):
+    # --compact prints only the result and --json one object per line, so every input line gets one output line
+    if output_format == "json":
+        record = {"expression": expression}
+        if error is None:
+            record["result"] = format_number(result)
+        else:
+            record["error"] = error
+        try:
+            return json.dumps(record, allow_nan=False)
+        except ValueError:
+            # JSON has no Infinity or NaN (e.g., 1e400), so a non-finite result is reported as an error
+            return json.dumps({"expression": expression, "error": "Result is not finite: {}".format(result)})
+    if error is not None:
+        return "Error: {}".format(error)
+    if output_format == "compact":
+        return "" if result is None else str(format_number(result))
+    return render(expression, result)
+
+
+def serve(lines, output_format, flush):
+    # Evaluates one expression per line in this process, reusing the calculator's compiled programs
     calculator = Calculator()
-    if len(sys.argv) <= 1:
-        print("Calculator App")
-        print('Usage: python main.py "<expression>"')
-        print('Example: python main.py "3 + 5"')
+    write = sys.stdout.write
+    for line in lines:
+        expression = line.strip()
+        if not expression and output_format == "box":
+            continue
+        result = error = None
+        try:
+            result = calculator.evaluate(expression)
+        except Exception as e:
+            error = str(e)
+        write(format_line(expression, result, error, output_format) + "\n")
+        if flush:
+            sys.stdout.flush()  # A caller writing to a pipe waits for each answer
+
+
+def main():
+    args = sys.argv[1:]
+    output_format = "box"
+    for option in ("--compact", "--json"):
+        if option in args:
+            args.remove(option)
+            output_format = option[2:]
+    if not args:
+        print_usage()
         return
 
-    expression = " ".join(sys.argv[1:])
-    try:
-        result = calculator.evaluate(expression)
-        to_print = render(expression, result)
-        print(to_print)
-    except Exception as e:
-        print(f"Error: {e}")
+    if args[0] == "--stdin":
+        serve(sys.stdin, output_format, flush=True)
+    elif args[0] == "--file":
+        if len(args) < 2:
+            print_usage()
+            return
+        try:
+            with open(args[1], "r", encoding="utf-8") as f:
+                serve(f, output_format, flush=False)
+        except OSError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    else:
+        expression = " ".join(args)
+        serve([expression], output_format, flush=False)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
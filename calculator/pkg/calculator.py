@@ -1,59 +1,246 @@
-
 # calculator.py
 
+import re
+import math
+import operator
+from functools import lru_cache
+from itertools import repeat
+
+try:
+    import numpy as np
+except ImportError:  # Optional: without NumPy, columns are evaluated with plain lists
+    np = None
+
+
+# One token per match: a number (decimal or scientific notation), a name, an operator or parenthesis, or any other
+# character (an error). Whitespace between tokens is skipped, so "(2*3)+x" and "( 2 * 3 ) + x" are equivalent
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+        |(?P<name>[^\W\d]\w*)
+        |(?P<symbol>[-+*/()])
+        |(?P<error>\S)
+    )
+""", re.VERBOSE)
+
+
+def tokenize(expression):
+    # Yields numbers as floats and names and symbols as strings, in one left-to-right pass over the text
+    for match in _TOKEN.finditer(expression):
+        kind = match.lastgroup
+        if kind == "number":
+            yield float(match.group(kind))
+        elif kind == "error":
+            raise ValueError("Invalid token: {}".format(match.group(kind)))
+        else:
+            yield match.group(kind)
+
+
+class Program:
+    # A compiled expression: postfix instructions, where a float is pushed, a str pushes the value of that
+    # variable, and a function applies an operator
+    def __init__(self, expression, instructions):
+        self.expression = expression
+        self.instructions = instructions
+        self.variables = tuple(dict.fromkeys(
+            instruction for instruction in instructions if instruction.__class__ is str
+        ))
+
+    def run(self, variables=None):
+        if self.variables:
+            self._check_variables(variables or {})
+        values = []
+        push = values.append
+        pop = values.pop
+        for instruction in self.instructions:
+            kind = instruction.__class__
+            if kind is float:
+                push(instruction)
+            elif kind is str:
+                push(variables[instruction])
+            else:
+                right = pop()
+                values[-1] = instruction(values[-1], right)
+        return values[0]
+
+    def run_columns(self, columns, use_numpy=None):
+        # Evaluates every row of columns (variable name -> sequence of values) in one pass per operator, over
+        # whole columns instead of row by row. Division by zero gives inf or nan instead of raising.
+        # Returns a NumPy array, or a list when NumPy is not installed or use_numpy is False
+        if use_numpy is None:
+            use_numpy = np is not None
+        elif use_numpy and np is None:
+            raise ValueError("NumPy is not installed")
+        self._check_variables(columns)
+        lengths = {len(column) for column in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("Columns have different lengths")
+        rows = lengths.pop() if lengths else 0
+        if use_numpy:
+            return self._run_numpy(columns, rows)
+        return self._run_lists(columns, rows)
+
+    def _run_numpy(self, columns, rows):
+        values = []
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for instruction in self.instructions:
+                kind = instruction.__class__
+                if kind is float:
+                    values.append(np.float64(instruction))
+                elif kind is str:
+                    values.append(np.asarray(columns[instruction], dtype=np.float64))
+                else:
+                    right = values.pop()
+                    values[-1] = instruction(values[-1], right)
+        if np.ndim(values[0]) == 0:
+            return np.full(rows, values[0])
+        return values[0]
+
+    def _run_lists(self, columns, rows):
+        values = []
+        for instruction in self.instructions:
+            kind = instruction.__class__
+            if kind is float:
+                values.append(instruction)
+            elif kind is str:
+                values.append([float(value) for value in columns[instruction]])
+            else:
+                if instruction is operator.truediv:
+                    instruction = _divide
+                right = values.pop()
+                values[-1] = _apply_columns(instruction, values[-1], right)
+        if values[0].__class__ is not list:
+            return [values[0]] * rows
+        return values[0]
+
+    def _check_variables(self, bindings):
+        missing = [name for name in self.variables if name not in bindings]
+        if missing:
+            raise ValueError("Unknown variable: {}".format(", ".join(missing)))
+
+
+def _apply_columns(function, left, right):
+    # Applies an operator element by element, repeating a constant operand for every row
+    if left.__class__ is list:
+        if right.__class__ is list:
+            return list(map(function, left, right))
+        return list(map(function, left, repeat(right)))
+    if right.__class__ is list:
+        return list(map(function, repeat(left), right))
+    return function(left, right)
+
+
+def _divide(left, right):
+    # Division with IEEE results for a zero divisor, matching NumPy
+    try:
+        return left / right
+    except ZeroDivisionError:
+        if left == 0 or left != left:
+            return math.nan
+        return math.copysign(math.inf, left) * math.copysign(1.0, right)
+
+
 class Calculator:
-    def __init__(self):
+    def __init__(self, cache_size=1024):
         self.operators = {
-            "+": lambda a, b: a + b,
-            "-": lambda a, b: a - b,
-            "*": lambda a, b: a * b,
-            "/": lambda a, b: a / b,
+            "+": operator.add,
+            "-": operator.sub,
+            "*": operator.mul,
+            "/": operator.truediv,
         }
         self.precedence = {
             "+": 1,
             "-": 1,
             "*": 2,
             "/": 2,
+            "u-": 3,  # Unary minus
         }
+        # Compiled programs keyed by expression text, so repeated formulas skip parsing
+        self._compile_cached = lru_cache(maxsize=cache_size)(self._compile)
 
-    def evaluate(self, expression):
+    def evaluate(self, expression, variables=None):
         if not expression or expression.isspace():
             return None
-        tokens = expression.strip().split()
-        return self._evaluate_infix(tokens)
+        return self.compile(expression).run(variables)
 
-    def _apply_operator(self, operators, values):
-        operator = operators.pop()
-        right = values.pop()
-        left = values.pop()
-        result = self.operators[operator](left, right)
-        values.append(result)
+    def evaluate_many(self, expressions, variables=None):
+        results = []
+        for expression in expressions:
+            if not expression or expression.isspace():
+                results.append(None)
+            else:
+                results.append(self._compile_cached(expression).run(variables))
+        return results
 
-    def _evaluate_infix(self, tokens):
-        values = []
+    def evaluate_columns(self, expression, columns, use_numpy=None):
+        if not expression or expression.isspace():
+            return None
+        return self.compile(expression).run_columns(columns, use_numpy)
+
+    def compile(self, expression):
+        return self._compile_cached(expression)
+
+    def cache_info(self):
+        return self._compile_cached.cache_info()
+
+    def _compile(self, expression):
+        return Program(expression, tuple(self._to_postfix(tokenize(expression))))
+
+    def _to_postfix(self, tokens):
+        output = []
         operators = []
+        expect_operand = True  # Operands and operators must alternate
 
         for token in tokens:
-            if token.isdigit():
-                values.append(float(token))
+            if token.__class__ is float or token.isidentifier():
+                if not expect_operand:
+                    raise ValueError("Missing operator before: {}".format(token))
+                output.append(token)
+                expect_operand = False
             elif token in self.operators:
+                if expect_operand:
+                    if token == "-":
+                        operators.append("u-")
+                        continue
+                    raise ValueError("Not enough operands for operator: {}".format(token))
                 while (
                     operators
-                    and operators[-1] in self.operators
+                    and operators[-1] != '('
                     and self.precedence[operators[-1]] >= self.precedence[token]
                 ):
-                    self._apply_operator(operators, values)
+                    self._emit(output, operators.pop())
                 operators.append(token)
+                expect_operand = True
             elif token == '(':
+                if not expect_operand:
+                    raise ValueError("Missing operator before: (")
                 operators.append(token)
             elif token == ')':
+                if expect_operand:
+                    raise ValueError("Missing operand before: )")
                 while operators and operators[-1] != '(':
-                    self._apply_operator(operators, values)
+                    self._emit(output, operators.pop())
+                if not operators:
+                    raise ValueError("Mismatched parentheses")
                 operators.pop()  # Remove the '('
             else:
                 raise ValueError("Invalid token: {}".format(token))
 
+        if expect_operand:
+            raise ValueError("Expression ends without an operand")
         while operators:
-            self._apply_operator(operators, values)
+            token = operators.pop()
+            if token == '(':
+                raise ValueError("Mismatched parentheses")
+            self._emit(output, token)
 
-        return values[0]
+        return output
+
+    def _emit(self, output, symbol):
+        if symbol == "u-":
+            if output[-1].__class__ is float:
+                output[-1] = -output[-1]  # Fold the sign into a literal
+            else:
+                output.extend((-1.0, operator.mul))  # Exact for floats, so the runners need no unary case
+        else:
+            output.append(self.operators[symbol])
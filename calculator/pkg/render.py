@@ -1,10 +1,14 @@
 # render.py
 
-def render(expression, result):
+def format_number(result):
+    # Whole numbers are shown without a trailing ".0"
     if isinstance(result, float) and result.is_integer():
-        result_str = str(int(result))
-    else:
-        result_str = str(result)
+        return int(result)
+    return result
+
+
+def render(expression, result):
+    result_str = str(format_number(result))
 
     box_width = max(len(expression), len(result_str)) + 4
 
@@ -1,7 +1,11 @@
 # tests.py
 
+import io
+import math
 import unittest
-from pkg.calculator import Calculator
+from contextlib import redirect_stdout
+from pkg.calculator import Calculator, np
+from main import serve
 
 
 class TestCalculator(unittest.TestCase):
@@ -44,6 +48,98 @@ class TestCalculator(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.calculator.evaluate("+ 3")
 
+    def test_too_many_operands(self):
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate("3 5 +")
+
+    def test_parentheses(self):
+        result = self.calculator.evaluate("( 2 + 3 ) * 4")
+        self.assertEqual(result, 20)
+
+    def test_mismatched_parentheses(self):
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate("( 2 + 3")
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate("2 + 3 )")
+
+    def test_compiled_program_is_cached(self):
+        program = self.calculator.compile("2 * 3 + 4")
+        self.assertIs(self.calculator.compile("2 * 3 + 4"), program)
+        self.assertEqual(program.run(), 10)
+        self.assertEqual(self.calculator.cache_info().hits, 1)
+
+    def test_evaluate_many(self):
+        results = self.calculator.evaluate_many(["3 + 5", "", "2 * 3 - 8 / 2 + 5", "3 + 5"])
+        self.assertEqual(results, [8, None, 7, 8])
+
+    def test_unspaced_expression(self):
+        result = self.calculator.evaluate("(2*3)+4/2")
+        self.assertEqual(result, 8)
+
+    def test_decimals_and_scientific_notation(self):
+        result = self.calculator.evaluate("1.5e3 / 3 + .5")
+        self.assertEqual(result, 500.5)
+
+    def test_unary_minus(self):
+        self.assertEqual(self.calculator.evaluate("-3*2"), -6)
+        self.assertEqual(self.calculator.evaluate("2*-3"), -6)
+        self.assertEqual(self.calculator.evaluate("-(2+3)*4"), -20)
+        self.assertEqual(self.calculator.evaluate("2--x", {"x": 3}), 5)
+
+    def test_variables(self):
+        result = self.calculator.evaluate("price * qty - 2", {"price": 3, "qty": 4})
+        self.assertEqual(result, 10)
+
+    def test_unknown_variable(self):
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate("price * qty", {"price": 3})
+
+    def test_evaluate_columns(self):
+        columns = {"a": [1, 2, 3], "b": [4, 0, 6]}
+        result = self.calculator.evaluate_columns("a + 2 * b", columns, use_numpy=False)
+        self.assertEqual(result, [9, 2, 15])
+        result = self.calculator.evaluate_columns("3 + 5", columns, use_numpy=False)
+        self.assertEqual(result, [8, 8, 8])
+
+    def test_evaluate_columns_division_by_zero(self):
+        result = self.calculator.evaluate_columns("a / b", {"a": [1, -1, 0], "b": [0, 0, 0]}, use_numpy=False)
+        self.assertEqual(result[:2], [float("inf"), float("-inf")])
+        self.assertTrue(math.isnan(result[2]))
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_evaluate_columns_numpy(self):
+        columns = {"a": [1, 2, 3], "b": [4, 0, 6]}
+        expression = "( a - b ) / b * 2"
+        expected = self.calculator.evaluate_columns(expression, columns, use_numpy=False)
+        result = self.calculator.evaluate_columns(expression, columns, use_numpy=True)
+        self.assertEqual(list(result), expected)
+
+
+class TestServe(unittest.TestCase):
+    def serve_lines(self, lines, output_format):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            serve(lines, output_format, flush=False)
+        return output.getvalue().splitlines()
+
+    def test_compact_output(self):
+        result = self.serve_lines(["3+5\n", "\n", "1/0\n", "2.5*2\n"], "compact")
+        self.assertEqual(result, ["8", "", "Error: float division by zero", "5"])
+
+    def test_json_output(self):
+        result = self.serve_lines(["3 + 5", "$"], "json")
+        self.assertEqual(result, [
+            '{"expression": "3 + 5", "result": 8}',
+            '{"expression": "$", "error": "Invalid token: $"}',
+        ])
+
+    def test_json_output_non_finite(self):
+        result = self.serve_lines(["1e400", "1e400 - 1e400"], "json")
+        self.assertEqual(result, [
+            '{"expression": "1e400", "error": "Result is not finite: inf"}',
+            '{"expression": "1e400 - 1e400", "error": "Result is not finite: nan"}',
+        ])
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
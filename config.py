@@ -0,0 +1,54 @@
+"""
+Process-wide configuration. The .env file is read once, when this module is first imported, and every module
+reads its settings through these helpers instead of calling load_dotenv itself.
+"""
+import os
+import importlib
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+
+def env_str(name: str, default: str | None=None) -> str | None:
+    """Return a setting as a string, or default when it is not set."""
+    return os.getenv(name, default)
+
+
+def env_int(name: str, default: int | None=None) -> int:
+    """Return a setting as an integer; a setting without a default must be present in the environment or .env file."""
+    value = os.getenv(name)
+    if value is None or value == "":
+        if default is None:
+            raise ValueError(f'"{name}" is not set; add it to the .env file')
+        return default
+    return int(value)
+
+
+def env_bool(name: str, default: bool=False) -> bool:
+    """Return a setting as a boolean ("true" in any case is True)."""
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.lower() == "true"
+
+
+class LazyModule:
+    '''
+    Stand-in for a module that is imported on first attribute access. Used for the Gemini SDK, whose import
+    dominates startup, so that code paths that never talk to the model (usage errors, tools, tests) skip it.
+    '''
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+
+def lazy_module(name: str) -> LazyModule:
+    """Return a LazyModule for name (e.g., "google.genai.types")."""
+    return LazyModule(name)
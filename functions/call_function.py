@@ -1,30 +1,60 @@
-import os
-from dotenv import load_dotenv
-from google.genai import types
-from functions.schemas import *
+from __future__ import annotations
+import asyncio
+from functools import cache
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from config import env_int, env_str, lazy_module
 from functions.get_files_info import get_files_info
 from functions.get_file_content import get_file_content
-from functions.write_file import write_file
-from functions.run_python_file import run_python_file
+from functions.write_file import write_file, write_files
+from functions.run_python_file import run_python_file, run_python_file_async
+from functions.search_files import search_files
+from functions.tool_cache import call_cached, call_async
+from tracing import span
 
 
-load_dotenv()
-WORKING_DIR = os.getenv("WORKING_DIR")
+types = lazy_module("google.genai.types") # the SDK is imported on first use
+WORKING_DIR = env_str("WORKING_DIR")
+MAX_WORKERS = env_int("MAX_WORKERS", 4)
 map_to_function = {
     "get_files_info": get_files_info,
     "get_file_content": get_file_content,
     "write_file": write_file,
+    "write_files": write_files,
     "run_python_file": run_python_file,
+    "search_files": search_files,
 }
-function_schemas = types.Tool(
-    # Available functions
-    function_declarations=[
+# Natively async versions used by call_function_async; other functions run in a worker thread
+async_functions = {
+    "run_python_file": run_python_file_async,
+}
+# Functions that change the working directory; these act as ordering barriers when dispatching in parallel
+sequential_functions = {"write_file", "write_files"}
+# Functions that can echo their output to the console; they receive the verbose flag
+console_functions = {"run_python_file"}
+
+
+@cache
+def get_function_schemas() -> types.Tool:
+    """Return the available function declarations bundled into a Tool object, built once on first use."""
+    from functions.schemas import (
         schema_get_files_info,
         schema_get_file_content,
         schema_write_file,
+        schema_write_files,
         schema_run_python_file,
-    ]
-)
+        schema_search_files,
+    )
+    return types.Tool(
+        # Available functions
+        function_declarations=[
+            schema_get_files_info,
+            schema_get_file_content,
+            schema_write_file,
+            schema_write_files,
+            schema_run_python_file,
+            schema_search_files,
+        ]
+    )
 
 
 def call_function(function_call: types.FunctionCall, verbose: bool=False) -> types.Content:
@@ -39,44 +69,176 @@ def call_function(function_call: types.FunctionCall, verbose: bool=False) -> typ
     Returns:
         Content object with role set to "tool" and result set to either function call output or error message.
     '''
+    args = function_arguments(function_call, verbose)
+
+    # Unsuccessful function call
+    if args is None:
+        return function_response_content(function_call.name, {"error": f"Unknown function: {function_call.name}"})
+
+    # Successful function call
+    # Call the actual Python function with unpacked arguments -> function output (repeated reads served from cache)
+    function_name = function_call.name
+    with span(f"tool.{function_name}") as attributes:
+        tool_function_output = call_cached(function_name, args, map_to_function[function_name])
+        attributes["result_chars"] = len(tool_function_output)
+    return function_response_content(function_name, {"result": tool_function_output})
+
+
+async def call_function_async(function_call: types.FunctionCall, verbose: bool=False) -> types.Content:
+    '''
+    Async version of call_function. Functions in async_functions are awaited on the event loop; the others
+    run through call_function's path in a worker thread.
+
+    Args:
+        function_call: Object containing function name and its arguments
+        verbose: Optional console argument
+    Returns:
+        Content object with role set to "tool" and result set to either function call output or error message.
+    '''
+    function_name = function_call.name
+    if function_name not in async_functions:
+        return await asyncio.to_thread(call_function, function_call, verbose)
+
+    args = function_arguments(function_call, verbose)
+    with span(f"tool.{function_name}") as attributes:
+        tool_function_output = await call_async(function_name, args, async_functions[function_name])
+        attributes["result_chars"] = len(tool_function_output)
+    return function_response_content(function_name, {"result": tool_function_output})
+
+
+def function_arguments(function_call: types.FunctionCall, verbose: bool) -> dict | None:
+    '''
+    Announces a function call and builds the keyword arguments to call its function with.
+
+    Args:
+        function_call: Object containing function name and its arguments
+        verbose: Optional console argument
+    Returns:
+        The model's arguments plus "working_directory" (and "verbose" for console functions), or None if the
+        function does not exist.
+    '''
     if verbose:
         print(f"Calling function: {function_call.name}({function_call.args})")
     else:
         print(f"Calling function: {function_call.name}")
 
-    function_name = function_call.name
-    tool_function_content: types.Content | None = None
+    if function_call.name not in map_to_function:
+        return None
 
-    # Unsuccessful function call
-    if function_name not in map_to_function:
-        # Content object created with role "tool" for function call to store default error message
-        tool_function_content = types.Content(
-            role="tool",
-            parts=[
-                types.Part.from_function_response(
-                    name=function_name,
-                    response={"error": f"Unknown function: {function_name}"},
-                )
-            ],
-        )
-    # Successful function call
-    else:
-        # Safeguard to set working directory
-        args = dict(function_call.args)
-        args["working_directory"] = WORKING_DIR
-
-        # Call the actual Python function with unpacked arguments -> function output
-        tool_function_output = map_to_function[function_name](**args)
-
-        # Content object created with role "tool" for function call to store actual function call output
-        tool_function_content = types.Content(
-            role="tool",
-            parts=[
-                types.Part.from_function_response(
-                    name=function_name,
-                    response={"result": tool_function_output},
-                )
-            ]
-        )
-
-    return tool_function_content
+    # Safeguard to set working directory
+    args = dict(function_call.args or {})
+    args["working_directory"] = WORKING_DIR
+    if function_call.name in console_functions:
+        args["verbose"] = verbose
+    return args
+
+
+def function_response_content(function_name: str, response: dict) -> types.Content:
+    '''
+    Wraps a function output or error message in a content object with role "tool".
+
+    Args:
+        function_name: Name of the function that was called
+        response: Either {"result": output} or {"error": message}
+    Returns:
+        Content object holding a single function response part.
+    '''
+    return types.Content(
+        role="tool",
+        parts=[
+            types.Part.from_function_response(
+                name=function_name,
+                response=response,
+            )
+        ],
+    )
+
+
+def call_functions(
+    function_calls: list[types.FunctionCall],
+    verbose: bool=False,
+    max_workers: int=MAX_WORKERS,
+) -> list[types.Content]:
+    '''
+    Executes all function calls from a single model response, running independent calls concurrently.
+    Calls are grouped into batches separated by functions that modify the working directory (e.g., write_file),
+    so a read requested after a write still observes the write. Results keep the model's original order.
+
+    Args:
+        function_calls: Function calls in the order returned by the model
+        verbose: Optional console argument
+        max_workers: Maximum number of threads per batch; a value of 1 runs calls one after another
+    Returns:
+        List of content objects, one per function call, in the same order as function_calls.
+    '''
+    if max_workers <= 1 or len(function_calls) <= 1:
+        return [call_function(function_call, verbose) for function_call in function_calls]
+
+    tool_function_contents: list[types.Content] = []
+    batch: list[types.FunctionCall] = []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(function_calls))) as executor:
+        for function_call in function_calls:
+            if function_call.name in sequential_functions:
+                # Flush pending independent calls, then run the barrier call on its own
+                tool_function_contents.extend(executor.map(lambda fc: call_function(fc, verbose), batch))
+                batch = []
+                tool_function_contents.append(call_function(function_call, verbose))
+            else:
+                batch.append(function_call)
+        tool_function_contents.extend(executor.map(lambda fc: call_function(fc, verbose), batch))
+
+    return tool_function_contents
+
+
+class StreamingDispatcher:
+    '''
+    Starts function calls as soon as they arrive from a streamed model response instead of after the whole response.
+    Follows the same rules as call_functions: independent calls run concurrently, functions that modify the working
+    directory (e.g., write_file) wait for earlier calls and block later ones, and results keep the arrival order.
+    '''
+
+    def __init__(self, verbose: bool=False, max_workers: int=MAX_WORKERS):
+        self.verbose = verbose
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self._futures: list[Future] = []
+
+    def submit(self, function_call: types.FunctionCall) -> None:
+        if function_call.name in sequential_functions:
+            wait(self._futures)
+            future = self._executor.submit(call_function, function_call, self.verbose)
+            wait([future])
+        else:
+            future = self._executor.submit(call_function, function_call, self.verbose)
+        self._futures.append(future)
+
+    def results(self) -> list[types.Content]:
+        """Wait for every submitted call and return the content objects in submission order."""
+        try:
+            return [future.result() for future in self._futures]
+        finally:
+            self._executor.shutdown()
+
+
+async def call_functions_async(function_calls: list[types.FunctionCall], verbose: bool=False) -> list[types.Content]:
+    '''
+    Async version of call_functions. Independent calls are awaited together and functions that modify
+    the working directory (e.g., write_file) act as barriers. Results keep the model's original order.
+
+    Args:
+        function_calls: Function calls in the order returned by the model
+        verbose: Optional console argument
+    Returns:
+        List of content objects, one per function call, in the same order as function_calls.
+    '''
+    tool_function_contents: list[types.Content] = []
+    batch: list[types.FunctionCall] = []
+    for function_call in function_calls:
+        if function_call.name in sequential_functions:
+            tool_function_contents.extend(await asyncio.gather(*(call_function_async(fc, verbose) for fc in batch)))
+            batch = []
+            tool_function_contents.append(await call_function_async(function_call, verbose))
+        else:
+            batch.append(function_call)
+    tool_function_contents.extend(await asyncio.gather(*(call_function_async(fc, verbose) for fc in batch)))
+
+    return tool_function_contents
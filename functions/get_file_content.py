@@ -1,20 +1,33 @@
 import os
-from dotenv import load_dotenv
+import codecs
+from config import env_int
 from functions.utils import root_dir
+from tracing import span
 
 
-load_dotenv()
-MAX_CHAR_LIMIT = int(os.getenv("MAX_CHAR_LIMIT"))
+MAX_CHAR_LIMIT = env_int("MAX_CHAR_LIMIT")
 
 
-def get_file_content(working_directory: str, file_path: str) -> str:
+def get_file_content(
+    working_directory: str,
+    file_path: str,
+    offset: int=0,
+    length: int | None=None,
+    start_line: int | None=None,
+    end_line: int | None=None,
+) -> str:
     """
     Returns the truncated contents of a file if it is within the root path; otherwise, returns an error message.
     A security check is enforced to prevent directory traversal outside the permitted root directory.
+    Only the requested part of the file is read, so large files can be paged through without loading them.
 
     Args:
         working_directory: The base directory where the file is located.
         file_path: The path to the Python file, relative to the working directory.
+        offset: Optional byte offset to start reading from; ignored when a line range is given.
+        length: Optional maximum number of bytes (or characters, for a line range) to return, capped at MAX_CHAR_LIMIT.
+        start_line: Optional first line to return (1-based).
+        end_line: Optional last line to return (inclusive).
     Returns:
         Output string for truncated filepath contents or error message.
     """
@@ -26,8 +39,73 @@ def get_file_content(working_directory: str, file_path: str) -> str:
             # safeguards against `traversal attacks` like `file_path=..\..\..`
         if not os.path.isfile(full_path): # valid path but not a file (i.e., a directory)
             return f'Error: File not found or is not a regular file: "{file_path}"'
-        with open(full_path, mode="r", encoding="utf-8") as f:
-            content = f.read()
-            return content[:MAX_CHAR_LIMIT]  # Safeguard to truncate to limit (preserve tokens)
+
+        limit = MAX_CHAR_LIMIT # Safeguard to truncate to limit (preserve tokens)
+        if length:
+            limit = max(1, min(int(length), MAX_CHAR_LIMIT))
+        if start_line or end_line:
+            return read_lines(full_path, file_path, int(start_line or 1), int(end_line) if end_line else None, limit)
+        return read_range(full_path, file_path, max(0, int(offset or 0)), limit)
     except Exception as e:
-        return f"Error: {str(e)}" # invalid file path provided, etc.    
+        return f"Error: {str(e)}" # invalid file path provided, etc.
+
+
+def read_range(full_path: str, file_path: str, offset: int, limit: int) -> str:
+    """
+    Reads at most limit bytes starting at a byte offset and decodes them as UTF-8.
+    A multi-byte character cut off at the end is left for the next page.
+
+    Args:
+        full_path: The resolved path to the file.
+        file_path: The path to the file as requested, used in the continuation note.
+        offset: Byte offset to start reading from.
+        limit: Maximum number of bytes to read.
+    Returns:
+        Decoded contents, followed by a note with the next offset when the file continues.
+    """
+    with span("io.read_file", offset=offset) as attributes, open(full_path, mode="rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        f.seek(offset)
+        data = f.read(limit)
+        attributes["bytes"] = len(data)
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    content = decoder.decode(data, final=False)
+    next_offset = offset + len(data) - len(decoder.getstate()[0])
+    if next_offset < file_size:
+        content += f'\n[...File "{file_path}" truncated at {limit} bytes; continue with offset={next_offset} of {file_size}]'
+    return content
+
+
+def read_lines(full_path: str, file_path: str, start_line: int, end_line: int | None, limit: int) -> str:
+    """
+    Reads a range of lines, streaming through the file and stopping as soon as the range or limit is reached.
+
+    Args:
+        full_path: The resolved path to the file.
+        file_path: The path to the file as requested, used in the continuation note.
+        start_line: First line to return (1-based).
+        end_line: Last line to return (inclusive), or None for the rest of the file.
+        limit: Maximum number of characters to return.
+    Returns:
+        The requested lines, followed by a note with the next line when the limit cut the range short.
+    """
+    lines = []
+    size = 0
+    with span("io.read_lines", start_line=start_line) as attributes, open(full_path, mode="r", encoding="utf-8", errors="replace") as f:
+        for line_number, line in enumerate(f, start=1):
+            if line_number < start_line:
+                continue
+            if end_line is not None and line_number > end_line:
+                break
+            if size + len(line) > limit:
+                next_line = line_number
+                if not lines: # a single line longer than the limit is truncated
+                    lines.append(line[:limit])
+                    next_line += 1
+                lines.append(f'\n[...File "{file_path}" truncated at {limit} characters; continue with start_line={next_line}]')
+                break
+            lines.append(line)
+            size += len(line)
+        attributes["characters"] = size
+    return "".join(lines)
@@ -1,19 +1,40 @@
 import os
+import fnmatch
+from config import env_int
 from functions.utils import root_dir
+from tracing import span
 
 
-def get_files_info(working_directory: str, directory: str=".") -> str:
+MAX_LIST_ENTRIES = env_int("MAX_LIST_ENTRIES", 200)
+
+
+def get_files_info(
+    working_directory: str,
+    directory: str=".",
+    recursive: bool=False,
+    pattern: str | None=None,
+    max_depth: int | None=None,
+    sort: str="name",
+    page: int=1,
+    limit: int | None=None,
+) -> str:
     """
     Returns contents with metadata at the path: root_dir() + working_directory + directory
     A security check is enforced to prevent directory traversal outside the permitted root directory.
+    Each entry is read with a single os.scandir pass (one stat call per entry) and results are paginated.
 
     Args:
         working_directory: The base directory, relative to the root directory.
         directory: The subdirectory, relative to the working directory; default value provided.
+        recursive: Optional flag to also list the contents of subdirectories.
+        pattern: Optional glob pattern entry names must match (e.g., "*.py").
+        max_depth: Optional depth limit for recursive listings; 1 lists only the directory itself.
+        sort: Optional sort order: "name" (default), "size" (largest first), or "none".
+        page: Optional page number (1-based).
+        limit: Optional number of entries per page, capped at MAX_LIST_ENTRIES.
     Returns:
         Output string for filepath metadata or error message.
     """
-    contents = []
     try:
         full_path = os.path.join(root_dir(), working_directory, directory)
         # safeguard against directory traversal (e.g., directory=..\..\..)
@@ -22,17 +43,64 @@ def get_files_info(working_directory: str, directory: str=".") -> str:
         if not os.path.isdir(full_path):
             return f'Error: "{directory}" is not a valid directory'
 
-        contents = os.listdir(full_path)
+        depth_limit = 1
+        if recursive:
+            depth_limit = int(max_depth) if max_depth else None
+        with span("io.scan_directory", recursive=bool(recursive)) as attributes:
+            entries = scan_directory(full_path, pattern, depth_limit)
+            attributes["entries"] = len(entries)
     except Exception as e:
         return f"Error: {str(e)}"
 
-    try:
-        files_info = []
-        for item in contents:
-            item_path = os.path.join(full_path, item)
-            file_size = os.path.getsize(item_path)
-            is_dir = os.path.isdir(item_path)
-            files_info.append(f"- {item}: file_size={file_size} bytes, is_dir={is_dir}")
-        return "\n".join(files_info)
-    except Exception as e:
-            return f"- Error: Cannot list file: {str(e)}"
+    if sort == "name":
+        entries.sort(key=lambda entry: entry[0])
+    elif sort == "size":
+        entries.sort(key=lambda entry: entry[1], reverse=True)
+
+    page_size = MAX_LIST_ENTRIES
+    if limit:
+        page_size = max(1, min(int(limit), MAX_LIST_ENTRIES))
+    page = max(1, int(page or 1))
+    start = (page - 1) * page_size
+    files_info = [
+        f"- {name}: file_size={file_size} bytes, is_dir={is_dir}" if error is None else f"- Error: Cannot list file: {error}"
+        for name, file_size, is_dir, error in entries[start:start + page_size]
+    ]
+    if start + page_size < len(entries):
+        files_info.append(
+            f"[...Showing entries {start + 1}-{start + page_size} of {len(entries)}; continue with page={page + 1}]"
+        )
+    elif not files_info and page > 1:
+        return f'Error: Page {page} is empty; "{directory}" has {len(entries)} entries'
+    return "\n".join(files_info)
+
+
+def scan_directory(full_path: str, pattern: str | None, depth_limit: int | None) -> list[tuple]:
+    """
+    Walks a directory with os.scandir, using the file type cached by scandir and one stat call per entry.
+    Symbolic links to directories are listed but not followed.
+
+    Args:
+        full_path: The resolved directory to list.
+        pattern: Optional glob pattern entry names must match; non-matching directories are still walked.
+        depth_limit: Number of directory levels to list, or None for no limit.
+    Returns:
+        List of (relative path, file size, is directory, error message or None) tuples.
+    """
+    entries = []
+    pending = [(full_path, "", 1)]
+    while pending:
+        path, prefix, depth = pending.pop()
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                name = prefix + entry.name
+                try:
+                    is_dir = entry.is_dir()
+                    if is_dir and not entry.is_symlink() and (depth_limit is None or depth < depth_limit):
+                        pending.append((entry.path, name + os.sep, depth + 1))
+                    if pattern and not fnmatch.fnmatch(entry.name, pattern):
+                        continue
+                    entries.append((name, entry.stat().st_size, is_dir, None))
+                except OSError as e:
+                    entries.append((name, 0, False, str(e)))
+    return entries
@@ -0,0 +1,145 @@
+"""
+Warm worker process used by functions.python_worker_pool.
+
+The worker starts once, imports commonly used modules, and then reads one JSON job per line from stdin:
+{"cwd": ..., "file_path": ..., "args": [...], "timeout": ...}, plus optional "max_output_bytes", "memory_limit_mb",
+and "cpu_limit". Every job runs in a fresh child forked from this
+process, so scripts skip interpreter startup but never share state with each other or with the worker.
+The result is written back as one JSON line: {"stdout": ..., "stderr": ..., "returncode": ..., "timed_out": ...}.
+"""
+import os
+import sys
+import json
+import time
+import runpy
+import signal
+import tempfile
+import traceback
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Imported once here so forked children start with them already loaded
+PRELOADED_MODULES = ["unittest", "json", "re", "collections", "dataclasses", "typing", "argparse", "math", "decimal"]
+
+
+def _run_child(job: dict, stdout_file, stderr_file) -> None:
+    """Runs the script in the forked child, mirroring `python <file_path> <args>` run from cwd. Never returns."""
+    exit_code = 1
+    try:
+        apply_limits(job.get("memory_limit_mb", 0), job.get("cpu_limit", 0))
+        os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+        os.dup2(stdout_file.fileno(), 1)
+        os.dup2(stderr_file.fileno(), 2)
+        os.chdir(job["cwd"])
+        script_path = os.path.abspath(job["file_path"])
+        sys.argv = [job["file_path"], *job["args"]]
+        sys.path[0] = os.path.dirname(script_path)
+        try:
+            runpy.run_path(script_path, run_name="__main__")
+            exit_code = 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                exit_code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+        except BaseException as e:
+            print_script_traceback(e, script_path)
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+
+def print_script_traceback(error: BaseException, script_path: str) -> None:
+    """Prints the traceback as `python <file_path>` would, starting at the script's first frame instead of runpy's."""
+    tb = error.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename != script_path:
+        tb = tb.tb_next
+    # A syntax error in the script has no script frame; Python prints it without a traceback
+    traceback.print_exception(type(error), error, tb)
+
+
+def apply_limits(memory_limit_mb: int, cpu_limit: int) -> None:
+    """Applies the memory (MB) and CPU time (seconds) limits to the current process; 0 leaves a limit unset."""
+    if resource is None:
+        return
+    if memory_limit_mb > 0:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if cpu_limit > 0:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit))
+
+
+def read_bounded(f, max_bytes: int | None) -> str:
+    """Reads a captured output file, keeping only its first and last max_bytes / 2 bytes when it is larger."""
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    if not max_bytes or size <= max_bytes:
+        return f.read().decode("utf-8", errors="replace")
+    head_limit = max_bytes // 2
+    tail_limit = max_bytes - head_limit
+    head = f.read(head_limit).decode("utf-8", errors="replace")
+    f.seek(size - tail_limit)
+    tail = f.read().decode("utf-8", errors="replace")
+    return f"{head}\n[...{size - max_bytes} bytes of output omitted...]\n{tail}"
+
+
+def run_job(job: dict) -> dict:
+    """Forks a child for one job, waits for it up to the timeout, and collects its output."""
+    with tempfile.TemporaryFile() as stdout_file, tempfile.TemporaryFile() as stderr_file:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            _run_child(job, stdout_file, stderr_file)
+
+        timed_out = False
+        deadline = time.monotonic() + job["timeout"]
+        while True:
+            waited_pid, status = os.waitpid(pid, os.WNOHANG)
+            if waited_pid:
+                break
+            if time.monotonic() > deadline:
+                os.kill(pid, signal.SIGKILL)
+                _, status = os.waitpid(pid, 0)
+                timed_out = True
+                break
+            time.sleep(0.002)
+
+        max_bytes = job.get("max_output_bytes")
+        return {
+            "stdout": read_bounded(stdout_file, max_bytes),
+            "stderr": read_bounded(stderr_file, max_bytes),
+            "returncode": os.waitstatus_to_exitcode(status),
+            "timed_out": timed_out,
+        }
+
+
+def main():
+    for module in PRELOADED_MODULES:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+
+    # Results go to the original stdout; children get their own stdout through dup2
+    protocol = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            result = run_job(json.loads(line))
+        except Exception as e:
+            result = {"error": str(e)}
+        protocol.write(json.dumps(result) + "\n")
+        protocol.flush()
+
+
+if __name__ == "__main__":
+    main()
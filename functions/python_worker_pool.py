@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import threading
+import subprocess
+from config import env_int
+
+
+PYTHON_WORKER_POOL = env_int("PYTHON_WORKER_POOL", 0) # number of warm workers; 0 disables the pool
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
+
+
+class WorkerError(Exception):
+    """Raised when a worker dies or returns an invalid response; the caller falls back to a fresh subprocess."""
+
+
+class PythonWorkerPool:
+    '''
+    Pool of pre-started Python interpreters (see functions/python_worker.py). Each run is handed to an idle worker,
+    which forks a clean child for it, so scripts skip interpreter startup without sharing state between runs.
+    Workers that die are replaced on the next run.
+    '''
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle: queue.Queue[subprocess.Popen | None] = queue.Queue()
+        self._workers: list[subprocess.Popen] = []
+        self._lock = threading.Lock()
+        for _ in range(size):
+            try:
+                worker = self._start_worker()
+            except OSError:
+                worker = None # started again on first use
+            self._idle.put(worker)
+
+    def _start_worker(self) -> subprocess.Popen:
+        worker = subprocess.Popen(
+            ["python", WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _discard(self, worker: subprocess.Popen) -> None:
+        worker.kill()
+        worker.wait()
+        with self._lock:
+            self._workers.remove(worker)
+
+    def run(self, cwd: str, file_path: str, args: list[str], timeout: float, limits: dict | None=None) -> tuple[str, str, int]:
+        '''
+        Runs `python <file_path> <args>` from cwd on a warm worker.
+
+        Args:
+            cwd: Directory to run the script from.
+            file_path: The path to the script, relative to cwd.
+            args: Arguments to pass to the script.
+            timeout: Seconds before the script is killed.
+            limits: Optional output and resource limits ("max_output_bytes", "memory_limit_mb", "cpu_limit").
+        Returns:
+            Tuple of (stdout, stderr, return code).
+        Raises:
+            subprocess.TimeoutExpired: The script ran longer than timeout.
+            WorkerError: The worker could not run the script.
+        '''
+        worker = self._idle.get()
+        try:
+            if worker is None or worker.poll() is not None:
+                worker = self._start_worker()
+            job = {"cwd": cwd, "file_path": file_path, "args": list(args), "timeout": timeout, **(limits or {})}
+            try:
+                worker.stdin.write(json.dumps(job) + "\n")
+                worker.stdin.flush()
+                line = worker.stdout.readline()
+                result = json.loads(line) if line else None
+            except (OSError, ValueError) as e:
+                raise WorkerError(f"Python worker failed: {e}") from e
+            if result is None or "error" in result:
+                raise WorkerError(f"Python worker failed: {result['error'] if result else 'worker exited'}")
+        except WorkerError:
+            self._discard(worker)
+            worker = None
+            raise
+        finally:
+            self._idle.put(worker)
+
+        if result["timed_out"]:
+            raise subprocess.TimeoutExpired(["python", file_path, *args], timeout)
+        return result["stdout"], result["stderr"], result["returncode"]
+
+    def close(self) -> None:
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            try:
+                worker.stdin.close() # the worker exits at end of input
+                worker.wait(timeout=1)
+            except (OSError, subprocess.TimeoutExpired):
+                worker.kill()
+                worker.wait()
+            worker.stdout.close()
+
+
+_pool: PythonWorkerPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> PythonWorkerPool | None:
+    """Return the shared worker pool, or None when it is disabled or the platform cannot fork."""
+    global _pool
+    if PYTHON_WORKER_POOL <= 0 or not hasattr(os, "fork") or sys.platform == "win32":
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = PythonWorkerPool(PYTHON_WORKER_POOL)
+            atexit.register(_pool.close)
+        return _pool
@@ -1,55 +1,307 @@
 import os
+import sys
+import asyncio
+import threading
 import subprocess
+from config import env_int
 from functions.utils import root_dir
+from functions.python_worker_pool import get_worker_pool, WorkerError
+from tracing import span
 
+try:
+    import resource
+except ImportError: # Windows; resource limits are not applied
+    resource = None
 
-def run_python_file(working_directory: str, file_path: str, args: list[str]=[]) -> str:
+
+MAX_OUTPUT_BYTES = env_int("MAX_OUTPUT_BYTES", 10000) # per stream; the head and tail are kept
+RUN_TIMEOUT = env_int("RUN_TIMEOUT", 30)
+MAX_RUN_TIMEOUT = env_int("MAX_RUN_TIMEOUT", 120)
+RUN_MEMORY_LIMIT_MB = env_int("RUN_MEMORY_LIMIT_MB", 0) # 0 disables the limit
+RUN_CPU_LIMIT = env_int("RUN_CPU_LIMIT", 0) # CPU seconds; 0 disables the limit
+READ_CHUNK_SIZE = 65536
+
+# Sets the limits in a short-lived interpreter that then execs the command, instead of running a preexec_fn between
+# fork and exec in this process, which is unsafe while other threads are running
+LIMIT_WRAPPER = """
+import os, sys, resource
+memory_limit_mb, cpu_limit = int(sys.argv[1]), int(sys.argv[2])
+if memory_limit_mb > 0:
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit_mb * 1024 * 1024,) * 2)
+if cpu_limit > 0:
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit))
+os.execvp(sys.argv[3], sys.argv[3:])
+"""
+
+
+def run_python_file(
+    working_directory: str,
+    file_path: str,
+    args: list[str]=[],
+    timeout: int | None=None,
+    verbose: bool=False,
+) -> str:
     '''
     Runs a specified Python file within the working directory with optional arguments.
     A security check is enforced to prevent directory traversal outside the permitted root directory.
+    When PYTHON_WORKER_POOL is set, the script runs on a warm worker interpreter instead of a fresh process.
+    Output is read incrementally and capped at MAX_OUTPUT_BYTES per stream, keeping its head and tail.
 
     Args:
         working_directory: The base directory where the file is located.
         file_path: The path to the Python file, relative to the working directory.
         args: Optional list of string arguments to pass to the script.
+        timeout: Optional number of seconds before the script is stopped, capped at MAX_RUN_TIMEOUT.
+        verbose: Optional flag to echo the script's output to the console as it runs.
     Returns:
         Output string (STDOUT, STDERR, and return code) of the executed script.
     '''
     try:
         full_path = os.path.join(root_dir(), working_directory, file_path)
-        # Safeguard against directory traversal
-        if ".." in file_path.split(os.path.sep) or not os.path.abspath(full_path).startswith(os.path.abspath(root_dir())):
-            return f'Error: Cannot execute "{file_path}" as it is outside the permitted working directory'
-        
-        if not os.path.exists(full_path):
-            return f'Error: File "{file_path}" not found'
-        if not full_path.endswith(".py"):
-            return f'Error: "{file_path}" is not a Python file.'
-        
+        error = check_python_file(full_path, file_path)
+        if error:
+            return error
+        timeout = run_timeout(timeout)
+
+        pool = get_worker_pool()
+        if pool is not None:
+            try:
+                with span("subprocess.run", file_path=file_path, pool=True) as attributes:
+                    output = pool.run(os.path.dirname(full_path), file_path, args, timeout, process_limits())
+                    attributes["returncode"] = output[2]
+                return format_process_output(*echo_output(output, verbose))
+            except (WorkerError, OSError):
+                pass # fall back to a fresh interpreter
+
         # Executes a Python file
         # ["python", file_path, *args] forms the command: python <file_path> <arg1> <arg2>...
-        completed_process = subprocess.run(
-            ["python", file_path, *args],
-            cwd=os.path.dirname(full_path),
-            capture_output=True, # Captures STDOUT and STDERR
-            timeout=30, # Safeguard to limit time
-            text = True
-        )
-
-        stdout = completed_process.stdout.strip()
-        stderr = completed_process.stderr.strip()
-        return_code = completed_process.returncode
-
-        output_parts = []
-        if stdout:
-            output_parts.append(f'STDOUT: {stdout}')
-        if stderr:
-            output_parts.append(f'STDERR: {stderr}')
-        if return_code != 0:
-            output_parts.append(f'Process exited with code {return_code}')
-
-        final_output = "\n".join(output_parts) if output_parts else "No output produced"
-        return final_output
+        with span("subprocess.run", file_path=file_path, pool=False) as attributes:
+            process = subprocess.Popen(
+                limited_command(["python", file_path, *args]),
+                cwd=os.path.dirname(full_path),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            stdout = BoundedOutput(MAX_OUTPUT_BYTES, console_stream(sys.stdout) if verbose else None)
+            stderr = BoundedOutput(MAX_OUTPUT_BYTES, console_stream(sys.stderr) if verbose else None)
+            readers = [
+                threading.Thread(target=drain_pipe, args=(process.stdout, stdout), daemon=True),
+                threading.Thread(target=drain_pipe, args=(process.stderr, stderr), daemon=True),
+            ]
+            for reader in readers:
+                reader.start()
+            try:
+                process.wait(timeout=timeout) # Safeguard to limit time
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+                raise
+            finally:
+                for reader in readers:
+                    reader.join(timeout=1)
+            attributes["returncode"] = process.returncode
+            attributes["output_bytes"] = stdout.total + stderr.total
+        return format_process_output(stdout.text(), stderr.text(), process.returncode)
+
+    except Exception as e:
+        return f"Error: executing Python file: {str(e)}"
+
+
+async def run_python_file_async(
+    working_directory: str,
+    file_path: str,
+    args: list[str]=[],
+    timeout: int | None=None,
+    verbose: bool=False,
+) -> str:
+    '''
+    Async version of run_python_file. The script runs in a child process awaited on the event loop,
+    so other agent sessions in the same process keep running while it executes.
+
+    Args:
+        working_directory: The base directory where the file is located.
+        file_path: The path to the Python file, relative to the working directory.
+        args: Optional list of string arguments to pass to the script.
+        timeout: Optional number of seconds before the script is stopped, capped at MAX_RUN_TIMEOUT.
+        verbose: Optional flag to echo the script's output to the console as it runs.
+    Returns:
+        Output string (STDOUT, STDERR, and return code) of the executed script.
+    '''
+    try:
+        full_path = os.path.join(root_dir(), working_directory, file_path)
+        error = check_python_file(full_path, file_path)
+        if error:
+            return error
+        timeout = run_timeout(timeout)
+
+        pool = get_worker_pool()
+        if pool is not None:
+            try:
+                with span("subprocess.run", file_path=file_path, pool=True) as attributes:
+                    output = await asyncio.to_thread(
+                        pool.run, os.path.dirname(full_path), file_path, args, timeout, process_limits()
+                    )
+                    attributes["returncode"] = output[2]
+                return format_process_output(*echo_output(output, verbose))
+            except (WorkerError, OSError):
+                pass # fall back to a fresh interpreter
+
+        with span("subprocess.run", file_path=file_path, pool=False) as attributes:
+            process = await asyncio.create_subprocess_exec(
+                *limited_command(["python", file_path, *args]),
+                cwd=os.path.dirname(full_path),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stdout = BoundedOutput(MAX_OUTPUT_BYTES, console_stream(sys.stdout) if verbose else None)
+            stderr = BoundedOutput(MAX_OUTPUT_BYTES, console_stream(sys.stderr) if verbose else None)
+            try:
+                await asyncio.wait_for( # Safeguard to limit time
+                    asyncio.gather(drain_stream(process.stdout, stdout), drain_stream(process.stderr, stderr), process.wait()),
+                    timeout=timeout,
+                )
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise subprocess.TimeoutExpired(["python", file_path, *args], timeout)
+            attributes["returncode"] = process.returncode
+            attributes["output_bytes"] = stdout.total + stderr.total
+
+        return format_process_output(stdout.text(), stderr.text(), process.returncode)
 
     except Exception as e:
         return f"Error: executing Python file: {str(e)}"
+
+
+class BoundedOutput:
+    '''
+    Collects a process stream chunk by chunk, keeping at most max_bytes: the first half and the most recent half.
+    Optionally echoes every chunk to a console stream as it arrives.
+    '''
+
+    def __init__(self, max_bytes: int, echo=None):
+        self.head_limit = max_bytes // 2
+        self.tail_limit = max_bytes - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+        self.echo = echo
+
+    def write(self, data: bytes) -> None:
+        self.total += len(data)
+        if self.echo is not None:
+            self.echo.write(data)
+            self.echo.flush()
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > self.tail_limit:
+                del self.tail[:len(self.tail) - self.tail_limit]
+
+    def text(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        tail = self.tail.decode("utf-8", errors="replace")
+        omitted = self.total - len(self.head) - len(self.tail)
+        if omitted <= 0:
+            return head + tail
+        return f"{head}\n[...{omitted} bytes of output omitted...]\n{tail}"
+
+
+def drain_pipe(pipe, output: BoundedOutput) -> None:
+    """Reads a child process pipe until it closes (run in a thread per pipe so neither pipe can fill up and block)."""
+    with pipe:
+        while chunk := os.read(pipe.fileno(), READ_CHUNK_SIZE):
+            output.write(chunk)
+
+
+async def drain_stream(stream: asyncio.StreamReader, output: BoundedOutput) -> None:
+    """Async version of drain_pipe for the streams of an asyncio subprocess."""
+    while chunk := await stream.read(READ_CHUNK_SIZE):
+        output.write(chunk)
+
+
+def console_stream(stream):
+    """Return the binary stream behind a console text stream, for echoing raw output."""
+    return getattr(stream, "buffer", None)
+
+
+def echo_output(output: tuple[str, str, int], verbose: bool) -> tuple[str, str, int]:
+    """Print the output of a pool run once it finishes (pool workers cannot stream it live)."""
+    if verbose:
+        stdout, stderr, _ = output
+        print(stdout, end="")
+        print(stderr, end="", file=sys.stderr)
+    return output
+
+
+def run_timeout(timeout: int | None) -> int:
+    """Return the requested timeout in seconds, defaulting to RUN_TIMEOUT and capped at MAX_RUN_TIMEOUT."""
+    if not timeout:
+        return RUN_TIMEOUT
+    return max(1, min(int(timeout), MAX_RUN_TIMEOUT))
+
+
+def process_limits() -> dict:
+    """Return the output and resource limits applied to every script run."""
+    return {
+        "max_output_bytes": MAX_OUTPUT_BYTES,
+        "memory_limit_mb": RUN_MEMORY_LIMIT_MB,
+        "cpu_limit": RUN_CPU_LIMIT,
+    }
+
+
+def limited_command(command: list[str]) -> list[str]:
+    """Return the command wrapped so the memory and CPU limits apply to it, or unchanged if none apply."""
+    if resource is None or (RUN_MEMORY_LIMIT_MB <= 0 and RUN_CPU_LIMIT <= 0):
+        return command
+    return [sys.executable, "-S", "-c", LIMIT_WRAPPER, str(RUN_MEMORY_LIMIT_MB), str(RUN_CPU_LIMIT), *command]
+
+
+def check_python_file(full_path: str, file_path: str) -> str | None:
+    '''
+    Validates that a script path is a Python file inside the permitted root directory.
+
+    Args:
+        full_path: The resolved path to the Python file.
+        file_path: The path to the Python file as requested, used in error messages.
+    Returns:
+        Error message if the file cannot be executed; otherwise, None.
+    '''
+    # Safeguard against directory traversal
+    if ".." in file_path.split(os.path.sep) or not os.path.abspath(full_path).startswith(os.path.abspath(root_dir())):
+        return f'Error: Cannot execute "{file_path}" as it is outside the permitted working directory'
+
+    if not os.path.exists(full_path):
+        return f'Error: File "{file_path}" not found'
+    if not full_path.endswith(".py"):
+        return f'Error: "{file_path}" is not a Python file.'
+    return None
+
+
+def format_process_output(stdout: str, stderr: str, return_code: int) -> str:
+    '''
+    Formats the captured output of a finished Python process for the model.
+
+    Args:
+        stdout: Captured standard output.
+        stderr: Captured standard error.
+        return_code: Exit code of the process.
+    Returns:
+        Output string (STDOUT, STDERR, and return code) or a default message when nothing was produced.
+    '''
+    stdout = stdout.strip()
+    stderr = stderr.strip()
+
+    output_parts = []
+    if stdout:
+        output_parts.append(f'STDOUT: {stdout}')
+    if stderr:
+        output_parts.append(f'STDERR: {stderr}')
+    if return_code != 0:
+        output_parts.append(f'Process exited with code {return_code}')
+
+    final_output = "\n".join(output_parts) if output_parts else "No output produced"
+    return final_output
@@ -1,10 +1,11 @@
 from google.genai import types
+from functions.run_python_file import RUN_TIMEOUT, MAX_RUN_TIMEOUT
 
 
 # Step #1: Define function declarations
 schema_get_files_info = types.FunctionDeclaration(
     name="get_files_info",
-    description="Lists files in the specified directory along with their sizes, constrained to the working directory.",
+    description="Lists files in the specified directory along with their sizes, constrained to the working directory. Supports recursive listing, name filtering, sorting, and pagination.",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -12,6 +13,31 @@ schema_get_files_info = types.FunctionDeclaration(
                 type=types.Type.STRING,
                 description="The directory to list files from, relative to the working directory. If not provided, lists files in the working directory itself.",
             ),
+            "recursive": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Optional flag to also list files in subdirectories. Entries are shown as paths relative to the directory.",
+            ),
+            "pattern": types.Schema(
+                type=types.Type.STRING,
+                description='Optional glob pattern that file and directory names must match, e.g. "*.py".',
+            ),
+            "max_depth": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional number of directory levels to list when recursive; 1 lists only the directory itself.",
+            ),
+            "sort": types.Schema(
+                type=types.Type.STRING,
+                enum=["name", "size", "none"],
+                description='Optional sort order: "name" (default), "size" (largest first), or "none".',
+            ),
+            "page": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional page number (1-based) for directories with more entries than fit on one page.",
+            ),
+            "limit": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional number of entries per page, capped at the listing limit.",
+            ),
         },
     ),
 )
@@ -19,7 +45,7 @@ schema_get_files_info = types.FunctionDeclaration(
 
 schema_get_file_content = types.FunctionDeclaration(
     name="get_file_content",
-    description="Lists file contents in the specified directory, constrained to the working directory and character limit.",
+    description="Lists file contents in the specified directory, constrained to the working directory and character limit. Large files can be read page by page with offset/length or with a line range; truncated output ends with a note telling where to continue.",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -27,15 +53,52 @@ schema_get_file_content = types.FunctionDeclaration(
                 type=types.Type.STRING,
                 description="The file path, relative to the working directory.",
             ),
+            "offset": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional byte offset to start reading from. Defaults to 0 (start of file).",
+            ),
+            "length": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional maximum number of bytes (or characters, for a line range) to return. Capped at the character limit.",
+            ),
+            "start_line": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional first line to return (1-based). When a line range is given, offset is ignored.",
+            ),
+            "end_line": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional last line to return (inclusive).",
+            ),
         },
         required=["file_path"],
     ),
 )
 
 
+# Search-and-replace edits shared by write_file and write_files
+schema_edits = types.Schema(
+    type=types.Type.ARRAY,
+    items=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "search": types.Schema(
+                type=types.Type.STRING,
+                description="Exact text to find; it must occur exactly once in the file.",
+            ),
+            "replace": types.Schema(
+                type=types.Type.STRING,
+                description="Text to put in its place.",
+            ),
+        },
+        required=["search", "replace"],
+    ),
+    description="Optional search-and-replace edits applied in order to the existing file, instead of content.",
+)
+
+
 schema_write_file = types.FunctionDeclaration(
     name="write_file",
-    description="Writes file contents in the specified directory, constrained to the working directory and file path.",
+    description="Writes file contents in the specified directory, constrained to the working directory and file path. To change part of an existing file, pass edits or a unified diff instead of the full content.",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -45,10 +108,50 @@ schema_write_file = types.FunctionDeclaration(
             ),
             "content": types.Schema(
                 type=types.Type.STRING,
-                description="The file contents to write.",
-            )
+                description="The full file contents to write.",
+            ),
+            "edits": schema_edits,
+            "diff": types.Schema(
+                type=types.Type.STRING,
+                description="Optional unified diff (with @@ hunk headers) to apply to the existing file.",
+            ),
         },
-        required=["file_path", "content"],
+        required=["file_path"],
+    ),
+)
+
+
+schema_write_files = types.FunctionDeclaration(
+    name="write_files",
+    description="Writes several files in one call. All files are checked first; if any write would fail, no file is written.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "files": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "file_path": types.Schema(
+                            type=types.Type.STRING,
+                            description="The file path, relative to the working directory.",
+                        ),
+                        "content": types.Schema(
+                            type=types.Type.STRING,
+                            description="The full file contents to write.",
+                        ),
+                        "edits": schema_edits,
+                        "diff": types.Schema(
+                            type=types.Type.STRING,
+                            description="Optional unified diff to apply to the existing file.",
+                        ),
+                    },
+                    required=["file_path"],
+                ),
+                description="Files to write, each with exactly one of content, edits, or diff.",
+            ),
+        },
+        required=["files"],
     ),
 )
 
@@ -67,8 +170,36 @@ schema_run_python_file = types.FunctionDeclaration(
                 type=types.Type.ARRAY,
                 items=types.Schema(type=types.Type.STRING),  # specify array element type
                 description="Optional list of string arguments.",
-            )
+            ),
+            "timeout": types.Schema(
+                type=types.Type.INTEGER,
+                description=f"Optional number of seconds before the script is stopped (default {RUN_TIMEOUT}, at most {MAX_RUN_TIMEOUT}). Raise it only for slow scripts.",
+            ),
         },
         required=["file_path"],
     ),
 )
+
+
+schema_search_files = types.FunctionDeclaration(
+    name="search_files",
+    description="Searches text files in the working directory for lines containing the query (case-insensitive) and returns matches as path:line: text. Use it to find where a name is defined or used instead of reading files one by one.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "query": types.Schema(
+                type=types.Type.STRING,
+                description="The text to search for, e.g. a function or variable name.",
+            ),
+            "directory": types.Schema(
+                type=types.Type.STRING,
+                description="Optional directory to limit the search to, relative to the working directory.",
+            ),
+            "max_results": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional maximum number of matching lines to return.",
+            ),
+        },
+        required=["query"],
+    ),
+)
@@ -0,0 +1,290 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from config import env_int, env_str
+from functions.utils import root_dir
+from tracing import span
+
+
+SEARCH_INDEX_DIR = env_str("SEARCH_INDEX_DIR", os.path.join(".cache", "search_index"))
+MAX_SEARCH_RESULTS = env_int("MAX_SEARCH_RESULTS", 50)
+MAX_INDEXED_FILE_SIZE = 1_000_000 # bytes; larger files are not tokenized and are scanned on every search
+# Seconds between scans of the tree for changes made outside the agent; the agent's own writes are indexed directly
+REFRESH_INTERVAL = 5.0
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+skipped_directories = {".git", ".hg", ".svn", "__pycache__", ".venv", "venv", "node_modules", ".cache", ".mypy_cache", ".pytest_cache"}
+
+
+def tokenize(text: str) -> set[str]:
+    """Return the distinct lowercase identifier-like tokens in a text."""
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+
+class SearchIndex:
+    '''
+    Inverted index from tokens to the files containing them, for one directory tree.
+    The index is persisted as JSON and kept current by comparing file modification times and sizes,
+    so only new or changed files are read again. Files written by the agent are re-indexed as they are written;
+    the whole tree is scanned again only after a script ran or REFRESH_INTERVAL seconds after the last scan.
+    '''
+
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+        name = hashlib.sha1(base_path.encode("utf-8")).hexdigest()[:16]
+        self.index_path = os.path.join(SEARCH_INDEX_DIR, f"{name}.json")
+        self.files: dict[str, tuple[int, int, list[str]]] = {} # relative path -> (mtime_ns, size, tokens)
+        self.postings: dict[str, set[str]] = {} # token -> relative paths
+        self.trigrams: dict[str, set[str]] = {} # 3-character substring -> indexed tokens containing it
+        self.oversized: set[str] = set() # files over MAX_INDEXED_FILE_SIZE, which are always candidates
+        self.lock = threading.Lock()
+        self.dirty = False # changed in memory since the last save
+        self.stale = True # files may have changed in ways the index was not told about
+        self.last_scan = 0.0
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for path, (mtime_ns, size, tokens) in data.get("files", {}).items():
+            self._add(path, mtime_ns, size, tokens)
+
+    def _save(self) -> None:
+        os.makedirs(SEARCH_INDEX_DIR, exist_ok=True)
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"base_path": self.base_path, "files": self.files}, f)
+        os.replace(temp_path, self.index_path)
+
+    def _add(self, path: str, mtime_ns: int, size: int, tokens: list[str]) -> None:
+        self.files[path] = (mtime_ns, size, tokens)
+        if size > MAX_INDEXED_FILE_SIZE:
+            self.oversized.add(path)
+        for token in tokens:
+            paths = self.postings.get(token)
+            if paths is None:
+                paths = self.postings[token] = set()
+                for trigram in trigrams(token):
+                    self.trigrams.setdefault(trigram, set()).add(token)
+            paths.add(path)
+
+    def _remove(self, path: str) -> None:
+        _, _, tokens = self.files.pop(path)
+        self.oversized.discard(path)
+        for token in tokens:
+            paths = self.postings.get(token)
+            if paths:
+                paths.discard(path)
+                if not paths:
+                    del self.postings[token]
+                    for trigram in trigrams(token):
+                        self.trigrams[trigram].discard(token)
+                        if not self.trigrams[trigram]:
+                            del self.trigrams[trigram]
+
+    def _index_file(self, path: str, stat: os.stat_result) -> None:
+        if path in self.files:
+            self._remove(path)
+        tokens = []
+        if stat.st_size <= MAX_INDEXED_FILE_SIZE:
+            try:
+                with open(os.path.join(self.base_path, path), "rb") as f:
+                    data = f.read()
+                if b"\0" not in data[:1024]: # skip binary files
+                    tokens = sorted(tokenize(data.decode("utf-8", errors="ignore")))
+            except OSError:
+                pass
+        self._add(path, stat.st_mtime_ns, stat.st_size, tokens)
+
+    def refresh(self) -> None:
+        """Bring the index up to date, scanning the tree only when it may have changed without the index knowing."""
+        if self.stale or time.monotonic() - self.last_scan >= REFRESH_INTERVAL:
+            self.scan()
+        elif self.dirty:
+            self._save()
+            self.dirty = False
+
+    def scan(self) -> None:
+        """Re-index files that are new or changed since the last scan and drop deleted ones."""
+        self.stale = False
+        self.last_scan = time.monotonic()
+        seen = set()
+        changed = False
+        pending = [self.base_path]
+        while pending:
+            with os.scandir(pending.pop()) as iterator:
+                for entry in iterator:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in skipped_directories:
+                            pending.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    path = os.path.relpath(entry.path, self.base_path)
+                    seen.add(path)
+                    stat = entry.stat()
+                    indexed = self.files.get(path)
+                    if indexed is None or indexed[0] != stat.st_mtime_ns or indexed[1] != stat.st_size:
+                        self._index_file(path, stat)
+                        changed = True
+        for path in [path for path in self.files if path not in seen]:
+            self._remove(path)
+            changed = True
+        if changed or self.dirty:
+            self._save()
+            self.dirty = False
+
+    def update_file(self, full_path: str) -> None:
+        """Re-index a single file right after it was written; the index is saved on the next refresh."""
+        path = os.path.relpath(full_path, self.base_path)
+        try:
+            self._index_file(path, os.stat(full_path))
+        except FileNotFoundError:
+            if path in self.files:
+                self._remove(path)
+        self.dirty = True
+
+    def candidates(self, query: str) -> set[str]:
+        '''
+        Return the files that can contain the query: those holding a matching indexed token for each query token,
+        plus every file too large to be tokenized.
+        '''
+        result = None
+        query = query.lower()
+        for match in TOKEN_PATTERN.finditer(query):
+            paths = set()
+            for token in self.matching_tokens(match.group(), match.start() > 0, match.end() < len(query)):
+                paths |= self.postings[token]
+            result = paths if result is None else result & paths
+            if not result:
+                return set(self.oversized)
+        return result | self.oversized if result is not None else set(self.files)
+
+    def matching_tokens(self, query_token: str, starts_token: bool, ends_token: bool) -> list[str]:
+        '''
+        Return the indexed tokens a query token can be part of. A query token with non-token characters on both
+        sides is a whole token of any matching line; at the start (end) of the query it may be the end (start)
+        of a longer token.
+
+        Args:
+            query_token: Token of the lowercase query
+            starts_token: The query token is preceded by a non-token character in the query
+            ends_token: The query token is followed by a non-token character in the query
+        Returns:
+            Indexed tokens that contain the query token in the required position.
+        '''
+        if starts_token and ends_token:
+            return [query_token] if query_token in self.postings else []
+        if starts_token:
+            matches = str.startswith
+        elif ends_token:
+            matches = str.endswith
+        else:
+            matches = str.__contains__
+        token_trigrams = trigrams(query_token)
+        if not token_trigrams:
+            tokens = self.postings # too short for a trigram lookup; check every token
+        else:
+            # Tokens containing all trigrams of the query token, starting from the rarest trigram
+            sets = sorted((self.trigrams.get(trigram, set()) for trigram in token_trigrams), key=len)
+            tokens = sets[0].intersection(*sets[1:])
+        return [token for token in tokens if matches(token, query_token)]
+
+
+def trigrams(token: str) -> set[str]:
+    """Return the distinct 3-character substrings of a token (none for tokens shorter than 3 characters)."""
+    return {token[index:index + 3] for index in range(len(token) - 2)}
+
+
+_indexes: dict[str, SearchIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(base_path: str) -> SearchIndex:
+    """Return the index for a working directory, loading it from disk on first use."""
+    with _indexes_lock:
+        if base_path not in _indexes:
+            _indexes[base_path] = SearchIndex(base_path)
+        return _indexes[base_path]
+
+
+def notify_file_changed(full_path: str) -> None:
+    """Update every loaded index that covers a file written by the agent (indexes not yet loaded catch up on refresh)."""
+    full_path = os.path.abspath(full_path)
+    with _indexes_lock:
+        indexes = [index for base_path, index in _indexes.items() if full_path.startswith(base_path + os.sep)]
+    for index in indexes:
+        with index.lock:
+            index.update_file(full_path)
+
+
+def notify_tree_changed() -> None:
+    """Mark every loaded index for a full scan on its next search (e.g., after a script that may have changed files)."""
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.stale = True
+
+
+def search_files(working_directory: str, query: str, directory: str=".", max_results: int | None=None) -> str:
+    """
+    Searches the text files of the working directory for lines containing the query (case-insensitive).
+    Candidate files come from a persistent token index that is updated incrementally, so only files that
+    can match are opened. Files over MAX_INDEXED_FILE_SIZE bytes are not indexed and are scanned on every search. A security check is enforced to prevent directory traversal outside the permitted root directory.
+
+    Args:
+        working_directory: The base directory, relative to the root directory.
+        query: The text to search for.
+        directory: Optional subdirectory to limit the search to, relative to the working directory.
+        max_results: Optional maximum number of matching lines, capped at MAX_SEARCH_RESULTS.
+    Returns:
+        Output string of "path:line: text" matches or error message.
+    """
+    try:
+        base_path = os.path.abspath(os.path.join(root_dir(), working_directory))
+        search_path = os.path.abspath(os.path.join(base_path, directory))
+        if not search_path.startswith(os.path.abspath(root_dir())):
+            return f'Error: Cannot search "{directory}" as it is outside the permitted working directory'
+        if not os.path.isdir(search_path):
+            return f'Error: "{directory}" is not a valid directory'
+        if not query or not query.strip():
+            return "Error: Search query is empty"
+
+        limit = MAX_SEARCH_RESULTS
+        if max_results:
+            limit = max(1, min(int(max_results), MAX_SEARCH_RESULTS))
+
+        index = get_index(base_path)
+        with index.lock, span("io.search_index", indexed_files=len(index.files)) as attributes:
+            index.refresh()
+            candidates = sorted(index.candidates(query))
+            attributes["candidates"] = len(candidates)
+
+        prefix = "" if search_path == base_path else os.path.relpath(search_path, base_path) + os.sep
+        needle = query.lower()
+        matches = []
+        for path in candidates:
+            if not path.startswith(prefix):
+                continue
+            with open(os.path.join(base_path, path), "r", encoding="utf-8", errors="replace") as f:
+                for line_number, line in enumerate(f, start=1):
+                    if needle in line.lower():
+                        matches.append(f"{path}:{line_number}: {line.strip()[:200]}")
+                        if len(matches) > limit:
+                            break
+            if len(matches) > limit:
+                break
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+    if not matches:
+        return f'No matches found for "{query}"'
+    if len(matches) > limit:
+        return "\n".join(matches[:limit]) + f"\n[...More than {limit} matches; narrow the query or directory]"
+    return "\n".join(matches)
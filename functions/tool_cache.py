@@ -0,0 +1,150 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from config import env_int
+from functions.utils import root_dir
+from functions.search_files import notify_file_changed, notify_tree_changed
+
+
+TOOL_CACHE_SIZE = env_int("TOOL_CACHE_SIZE", 256)
+
+# Read-only functions whose results can be cached, mapped to the argument holding their target path and its default.
+# A result is only valid while its target's mtime and size are unchanged; get_files_info is not cached because a
+# listing depends on the size of every entry, and checking those costs as much as listing the directory again
+cacheable_functions = {
+    "get_file_content": ("file_path", None),
+}
+
+
+class ToolResultCache:
+    '''
+    LRU cache of read-only function results. Entries are keyed on the function name, the resolved target path,
+    and the remaining arguments, and are only served while the target's modification time and size are unchanged.
+    '''
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[str, tuple | None, str]] = OrderedDict() # key -> (path, signature, result)
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, signature: tuple | None) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != signature:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: tuple, path: str, signature: tuple | None, result: str) -> None:
+        with self._lock:
+            self._entries[key] = (path, signature, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_path(self, path: str) -> None:
+        """Drop results for path."""
+        with self._lock:
+            for key, (entry_path, _, _) in list(self._entries.items()):
+                if path == entry_path:
+                    del self._entries[key]
+
+    def clear(self) -> None:
+        """Drop every entry and reset the hit and miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+tool_cache = ToolResultCache(TOOL_CACHE_SIZE)
+
+
+def _resolve_path(working_directory: str, path: str) -> str:
+    return os.path.abspath(os.path.join(root_dir(), working_directory, path))
+
+
+def _signature(path: str) -> tuple | None:
+    """Return (mtime, size) of a path, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _cache_key(function_name: str, args: dict) -> tuple[tuple, str] | None:
+    """Return the cache key and resolved target path for a cacheable call; otherwise, None."""
+    if TOOL_CACHE_SIZE <= 0 or function_name not in cacheable_functions:
+        return None
+    path_arg, default = cacheable_functions[function_name]
+    path = _resolve_path(args["working_directory"], args.get(path_arg) or default or "")
+    other_args = {name: value for name, value in args.items() if name not in (path_arg, "working_directory")}
+    return (function_name, path, json.dumps(other_args, sort_keys=True, default=str)), path
+
+
+def _after_call(function_name: str, args: dict) -> None:
+    """Invalidate cached results (and update the search index) after a function call that may have modified files."""
+    if function_name in ("write_file", "write_files"):
+        specs = (args.get("files") or []) if function_name == "write_files" else [args]
+        for spec in specs:
+            if spec.get("file_path"):
+                path = _resolve_path(args["working_directory"], spec["file_path"])
+                tool_cache.invalidate_path(path)
+                notify_file_changed(path)
+    elif function_name == "run_python_file":
+        notify_tree_changed()
+
+
+def call_cached(function_name: str, args: dict, function) -> str:
+    '''
+    Calls function(**args), serving read-only results from the cache while their target is unchanged.
+    Calls that modify the working directory invalidate the affected entries.
+
+    Args:
+        function_name: Name of the function being called
+        args: Keyword arguments for the function, including "working_directory"
+        function: The function to call on a cache miss
+    Returns:
+        Function output string.
+    '''
+    cache_key = _cache_key(function_name, args)
+    if cache_key is None:
+        result = function(**args)
+        _after_call(function_name, args)
+        return result
+
+    key, path = cache_key
+    signature = _signature(path) # taken before the call so a concurrent change is never cached as current
+    result = tool_cache.get(key, signature)
+    if result is None:
+        result = function(**args)
+        if signature is not None and not result.startswith("Error"):
+            tool_cache.put(key, path, signature, result)
+    return result
+
+
+async def call_async(function_name: str, args: dict, function) -> str:
+    '''
+    Awaits a natively async function (e.g., run_python_file_async), then invalidates what it may have changed.
+    Such functions run scripts or otherwise have side effects, so their results are never cached.
+
+    Args:
+        function_name: Name of the function being called
+        args: Keyword arguments for the function, including "working_directory"
+        function: The async function to await
+    Returns:
+        Function output string.
+    '''
+    result = await function(**args)
+    _after_call(function_name, args)
+    return result
@@ -1,32 +1,375 @@
 import os
+import re
+import shutil
+import tempfile
 from functions.utils import root_dir
+from tracing import span
 
 
-def write_file(working_directory: str, file_path: str, content: str) -> str:
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+
+def write_file(
+    working_directory: str,
+    file_path: str,
+    content: str | None=None,
+    edits: list[dict] | None=None,
+    diff: str | None=None,
+) -> str:
     '''
     Writes content to a file relative to a working directory, automatically creating parent directories
     if neccessary and overwritting files if already present. A security check is enforced to prevent
     directory traversal outside the permitted root directory.
+    Instead of the full content, an existing file can be patched with search-and-replace edits or a unified diff.
+    The file is replaced atomically, so an interrupted run never leaves it half-written.
 
     Args:
         working_directory: The base directory where the file is located.
         file_path: The path to the Python file, relative to the working directory.
         content: The string content to be written to the file.
+        edits: Optional list of {"search": ..., "replace": ...} edits; each search text must occur exactly once.
+        diff: Optional unified diff to apply to the file.
     Returns:
         Output string for success or error message.
     '''
     try:
-        full_path = os.path.join(root_dir(), working_directory, file_path)
-        # Safeguard against directory traversal
-        if not os.path.abspath(full_path).startswith(os.path.abspath(root_dir())):
-            return f'Error: Cannot write to "{file_path}" as it is outside the permitted working directory'
+        full_path, new_content, error = prepare_write(working_directory, file_path, content, edits, diff)
+        if error:
+            return error
+        atomic_write(full_path, new_content)
+        return write_message(file_path, new_content, edits, diff)
+
+    except Exception as e:
+        return f"Error: {str(e)}" # invalid file path provided, etc.
+
+
+def write_files(working_directory: str, files: list[dict]) -> str:
+    '''
+    Writes several files in one call, so that either all files are written or none are. Every file is validated
+    (and every patch applied in memory) first, then written to a temporary file, and only then are the temporary
+    files renamed into place; if a rename fails, the files already replaced are restored.
+
+    Args:
+        working_directory: The base directory where the files are located.
+        files: List of {"file_path": ..., and one of "content", "edits", or "diff"} as accepted by write_file.
+    Returns:
+        Output string with one line per file or error message.
+    '''
+    try:
+        if not files:
+            return "Error: No files to write"
 
-        # Ensure parent directories exists, create file, and overwrite
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        with open(full_path, "w", encoding="utf-8") as f:
-            f.write(content)
+        prepared = []
+        errors = []
+        seen = set()
+        for spec in files:
+            file_path = spec.get("file_path") or ""
+            full_path, new_content, error = prepare_write(
+                working_directory, file_path, spec.get("content"), spec.get("edits"), spec.get("diff")
+            )
+            if not error and os.path.abspath(full_path) in seen:
+                error = f'Error: "{file_path}" appears more than once'
+            if error:
+                errors.append(error)
+            else:
+                seen.add(os.path.abspath(full_path))
+                prepared.append((spec, full_path, new_content))
+        if errors:
+            return "Error: No files were written:\n" + "\n".join(f"- {error}" for error in errors)
 
-        return f'Successfully wrote to "{file_path}": ({len(content)} characters written)'
+        staged = []
+        created_directories = []
+        try:
+            for spec, full_path, new_content in prepared:
+                temp_path, created = stage_write(full_path, new_content)
+                staged.append((full_path, temp_path))
+                created_directories.extend(created)
+            commit_writes(staged)
+        except Exception as e:
+            for _, temp_path in staged:
+                _remove(temp_path)
+            for directory in reversed(created_directories):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+            return f"Error: No files were written: {str(e)}"
+        return "\n".join(
+            write_message(spec["file_path"], new_content, spec.get("edits"), spec.get("diff"))
+            for spec, _, new_content in prepared
+        )
 
     except Exception as e:
-        return f"Error: {str(e)}" # invalid file path provided, etc.    
+        return f"Error: {str(e)}"
+
+
+def prepare_write(
+    working_directory: str,
+    file_path: str,
+    content: str | None,
+    edits: list[dict] | None,
+    diff: str | None,
+) -> tuple[str, str | None, str | None]:
+    '''
+    Validates a write and computes the new file contents without touching the file.
+
+    Args:
+        working_directory: The base directory where the file is located.
+        file_path: The path to the file, relative to the working directory.
+        content: Full content to write, or None when patching.
+        edits: Optional search-and-replace edits for an existing file.
+        diff: Optional unified diff for an existing file.
+    Returns:
+        Tuple of (full path, new contents, error message); the error message is None when the write is valid.
+    '''
+    full_path = os.path.join(root_dir(), working_directory, file_path)
+    # Safeguard against directory traversal
+    if not file_path or not os.path.abspath(full_path).startswith(os.path.abspath(root_dir())):
+        return full_path, None, f'Error: Cannot write to "{file_path}" as it is outside the permitted working directory'
+
+    if os.path.isdir(full_path):
+        return full_path, None, f'Error: Cannot write to "{file_path}" as it is a directory'
+
+    modes = [mode for mode in (content, edits, diff) if mode is not None]
+    if len(modes) != 1:
+        return full_path, None, f'Error: Provide exactly one of content, edits, or diff for "{file_path}"'
+    if content is not None:
+        return full_path, content, None
+
+    if not os.path.isfile(full_path):
+        return full_path, None, f'Error: Cannot patch "{file_path}": file not found'
+    with open(full_path, "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    try:
+        new_content = apply_edits(text, edits) if edits is not None else apply_unified_diff(text, diff)
+    except ValueError as e:
+        return full_path, None, f'Error: Cannot patch "{file_path}": {str(e)}'
+    return full_path, new_content, None
+
+
+def apply_edits(text: str, edits: list[dict]) -> str:
+    '''
+    Applies search-and-replace edits in order. Each search text must occur exactly once in the current text,
+    so an edit can never silently change the wrong place. In a file with CRLF line endings, edits written
+    with LF line endings are converted to CRLF.
+
+    Args:
+        text: The current file contents.
+        edits: List of {"search": ..., "replace": ...} dictionaries.
+    Returns:
+        The edited text.
+    Raises:
+        ValueError: An edit is malformed or its search text is missing or ambiguous.
+    '''
+    if not edits:
+        raise ValueError("no edits given")
+    for number, edit in enumerate(edits, start=1):
+        search = edit.get("search")
+        replace = edit.get("replace", "")
+        if not search:
+            raise ValueError(f"edit {number} has an empty search text")
+        if "\r\n" in text and "\r\n" not in search:
+            search = search.replace("\n", "\r\n")
+            replace = replace.replace("\n", "\r\n")
+        count = text.count(search)
+        if count == 0:
+            raise ValueError(f"edit {number}: search text not found")
+        if count > 1:
+            raise ValueError(f"edit {number}: search text found {count} times; include more surrounding lines")
+        text = text.replace(search, replace, 1)
+    return text
+
+
+def apply_unified_diff(text: str, diff: str) -> str:
+    '''
+    Applies a unified diff to text. Hunks are matched on their context and removed lines; if the line numbers
+    in a hunk header are off, the nearest matching position after the previous hunk is used. Added lines take
+    the line ending of the lines they replace, so CRLF files stay CRLF.
+
+    Args:
+        text: The current file contents.
+        diff: Unified diff with one or more "@@ -a,b +c,d @@" hunks (file headers are optional).
+    Returns:
+        The patched text.
+    Raises:
+        ValueError: The diff has no hunks or a hunk does not match the text.
+    '''
+    lines = text.splitlines(keepends=True)
+    result = []
+    position = 0
+    for old_start, old_lines, new_lines in parse_hunks(diff):
+        start = find_block(lines, old_lines, max(old_start - 1, position), position)
+        if start is None:
+            raise ValueError(f"hunk starting at line {old_start} does not match the file")
+        result.extend(lines[position:start])
+        newline = _line_ending(lines[start:start + len(old_lines)] or lines[max(start - 1, 0):start + 1])
+        result.extend(line[:-1] + newline if line.endswith("\n") else line for line in new_lines)
+        position = start + len(old_lines)
+    result.extend(lines[position:])
+    return "".join(result)
+
+
+def parse_hunks(diff: str) -> list[tuple[int, list[str], list[str]]]:
+    """Split a unified diff into (old start line, old lines, new lines) hunks."""
+    hunks = []
+    diff_lines = (diff or "").splitlines()
+    index = 0
+    while index < len(diff_lines):
+        line = diff_lines[index]
+        index += 1
+        match = HUNK_HEADER.match(line)
+        if not match:
+            continue # file headers and other preamble
+        old_lines, new_lines = [], []
+        marker = " "
+        while index < len(diff_lines) and not diff_lines[index].startswith("@@"):
+            line = diff_lines[index]
+            if line.startswith("--- ") and index + 1 < len(diff_lines) and diff_lines[index + 1].startswith("+++ "):
+                break # header of the next file
+            index += 1
+            if line.startswith("\\"): # "\ No newline at end of file" applies to the previous line
+                blocks = {" ": (old_lines, new_lines), "-": (old_lines,), "+": (new_lines,)}.get(marker, ())
+                for block in blocks:
+                    if block and block[-1].endswith("\n"):
+                        block[-1] = block[-1][:-1]
+                continue
+            marker, body = (line[0], line[1:]) if line else (" ", "")
+            if marker in (" ", "-"):
+                old_lines.append(body + "\n")
+            if marker in (" ", "+"):
+                new_lines.append(body + "\n")
+        hunks.append((int(match.group(1)), old_lines, new_lines))
+    if not hunks:
+        raise ValueError("diff contains no hunks")
+    return hunks
+
+
+def _line_ending(lines: list[str]) -> str:
+    """Return the line ending used by the first terminated line ("\\n" when there is none)."""
+    for line in lines:
+        if line.endswith("\r\n"):
+            return "\r\n"
+        if line.endswith("\n"):
+            return "\n"
+    return "\n"
+
+
+def find_block(lines: list[str], block: list[str], expected: int, minimum: int) -> int | None:
+    """Return the index of block in lines closest to expected (and not before minimum), ignoring line endings."""
+    if not block:
+        return min(max(expected, minimum), len(lines))
+    target = [line.rstrip("\r\n") for line in block]
+    last_start = len(lines) - len(block)
+    for distance in range(len(lines) + 1):
+        for start in (expected - distance, expected + distance):
+            if minimum <= start <= last_start and [line.rstrip("\r\n") for line in lines[start:start + len(block)]] == target:
+                return start
+        if expected - distance < minimum and expected + distance > last_start:
+            return None
+    return None
+
+
+def atomic_write(full_path: str, content: str) -> None:
+    '''
+    Writes content to a temporary file next to the target and renames it over the target,
+    keeping the target's permissions. Parent directories are created if necessary.
+
+    Args:
+        full_path: The resolved path to the file.
+        content: The string content to be written to the file.
+    '''
+    temp_path, _ = stage_write(full_path, content)
+    try:
+        os.replace(temp_path, full_path)
+    except BaseException:
+        _remove(temp_path)
+        raise
+
+
+def stage_write(full_path: str, content: str) -> tuple[str, list[str]]:
+    '''
+    Writes content to a temporary file in the target's directory, with the target's permissions, ready to be
+    renamed over the target.
+
+    Args:
+        full_path: The resolved path to the file.
+        content: The string content to be written to the file.
+    Returns:
+        Tuple of the temporary file path and the parent directories that had to be created (outermost first).
+    '''
+    with span("io.write_file", characters=len(content)):
+        directory = os.path.dirname(full_path)
+        created = []
+        missing = directory
+        while missing and not os.path.isdir(missing):
+            created.insert(0, missing)
+            missing = os.path.dirname(missing)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(full_path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(full_path):
+                os.chmod(temp_path, os.stat(full_path).st_mode & 0o7777)
+            else:
+                os.chmod(temp_path, 0o644)
+        except BaseException:
+            _remove(temp_path)
+            raise
+        return temp_path, created
+
+
+def commit_writes(staged: list[tuple[str, str]]) -> None:
+    '''
+    Renames staged temporary files over their targets. The original of each target is kept as a backup until
+    every rename has succeeded; if one fails, the targets already replaced are restored (or removed if they
+    did not exist before), so either every target is updated or none is.
+
+    Args:
+        staged: List of (target path, temporary file path) pairs from stage_write.
+    '''
+    replaced = [] # (target path, backup path or None) for each target already renamed over
+    backups = []
+    try:
+        for full_path, temp_path in staged:
+            backup = None
+            if os.path.isfile(full_path):
+                backup = f"{temp_path}.orig"
+                backups.append(backup)
+                try:
+                    os.link(full_path, backup)
+                except OSError:
+                    shutil.copy2(full_path, backup) # file systems without hard links
+            os.replace(temp_path, full_path)
+            replaced.append((full_path, backup))
+    except BaseException:
+        for full_path, backup in reversed(replaced):
+            try:
+                if backup:
+                    os.replace(backup, full_path)
+                else:
+                    os.unlink(full_path)
+            except OSError:
+                pass
+        raise
+    finally:
+        for backup in backups:
+            _remove(backup)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def write_message(file_path: str, content: str, edits: list[dict] | None, diff: str | None) -> str:
+    """Return the success message for a write."""
+    if edits is not None:
+        return f'Successfully patched "{file_path}": {len(edits)} edit(s) applied ({len(content)} characters written)'
+    if diff is not None:
+        return f'Successfully patched "{file_path}" with diff ({len(content)} characters written)'
+    return f'Successfully wrote to "{file_path}": ({len(content)} characters written)'
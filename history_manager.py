@@ -0,0 +1,173 @@
+from __future__ import annotations
+import os
+import json
+from config import env_int, lazy_module
+from token_estimator import estimate_prompt_tokens, tokens_for_chars
+
+
+types = lazy_module("google.genai.types") # the SDK is imported on first use
+HISTORY_TOKEN_BUDGET = env_int("HISTORY_TOKEN_BUDGET", 32000)
+HISTORY_KEEP_RECENT = env_int("HISTORY_KEEP_RECENT", 4) # most recent contents that are never compacted
+
+ELIDED_PREFIX = "[Elided"
+# Outputs shorter than this are not worth replacing with a summary when over budget
+MIN_SUMMARIZED_CHARS = 500
+
+# Functions whose output only depends on the path they target; a later read of the same target (or a write of the
+# file's full content) makes the earlier output stale
+path_arguments = {
+    "get_file_content": "file_path",
+    "get_files_info": "directory",
+    "write_file": "file_path",
+}
+
+
+def _normalize_path(path: str | None) -> str:
+    return os.path.normpath(path or ".")
+
+
+def _tool_results(conversation_history: list[types.Content]) -> list[dict]:
+    '''
+    Pairs every function response in the history with the function call that produced it.
+    Model contents hold the calls and the following user content holds the responses in the same order.
+
+    Returns:
+        List of dictionaries with the content/part position, function name, arguments, and serialized response.
+    '''
+    results = []
+    for index in range(1, len(conversation_history)):
+        calls = [part.function_call for part in conversation_history[index - 1].parts or [] if part.function_call]
+        responses = [
+            (part_index, part) for part_index, part in enumerate(conversation_history[index].parts or [])
+            if part.function_response
+        ]
+        for call, (part_index, part) in zip(calls, responses):
+            if call.name != part.function_response.name:
+                continue
+            results.append({
+                "content_index": index,
+                "part_index": part_index,
+                "name": call.name,
+                "args": dict(call.args or {}),
+                "response": json.dumps(part.function_response.response, sort_keys=True, default=str),
+            })
+    return results
+
+
+def _output_text(result: dict) -> str:
+    """Return the text a function returned (its result or error)."""
+    output = json.loads(result["response"])
+    return str(output.get("result", output.get("error", "")))
+
+
+def _written_paths(result: dict) -> set[str]:
+    '''
+    Return the normalized paths whose whole content a successful write_file or write_files call replaced.
+    Writes that patch a file with edits or a diff leave the rest of an earlier read valid, and a failed
+    write changes nothing, so neither is included.
+    '''
+    if result["name"] == "write_file":
+        specs = [result["args"]]
+    elif result["name"] == "write_files":
+        specs = result["args"].get("files") or []
+    else:
+        return set()
+    if _output_text(result).startswith("Error"):
+        return set()
+    return {_normalize_path(spec.get("file_path")) for spec in specs if spec.get("content") is not None}
+
+
+def _supersedes(later: dict, earlier: dict) -> bool:
+    """Return True if the later function call makes the earlier output stale."""
+    if earlier["name"] not in ("get_file_content", "get_files_info"):
+        return False
+    path_argument = path_arguments[earlier["name"]]
+    path = _normalize_path(earlier["args"].get(path_argument))
+    if later["name"] in ("write_file", "write_files"):
+        return earlier["name"] == "get_file_content" and path in _written_paths(later)
+    if later["name"] != earlier["name"] or _normalize_path(later["args"].get(path_argument)) != path:
+        return False
+    # A read of a different range or with different options does not replace this one
+    other_args = lambda args: {name: value for name, value in args.items() if name != path_argument}
+    return other_args(later["args"]) == other_args(earlier["args"])
+
+
+def _is_elided(result: dict) -> bool:
+    return f'"{ELIDED_PREFIX}' in result["response"][:20]
+
+
+def _elide(conversation_history: list[types.Content], result: dict, reason: str) -> None:
+    """Replace one function response with a short placeholder that tells the model what was removed."""
+    content = conversation_history[result["content_index"]]
+    parts = list(content.parts)
+    parts[result["part_index"]] = types.Part.from_function_response(
+        name=result["name"],
+        response={"result": f"{ELIDED_PREFIX}: {reason}]"},
+    )
+    conversation_history[result["content_index"]] = types.Content(role=content.role, parts=parts)
+    result["response"] = json.dumps({"result": ELIDED_PREFIX})
+
+
+def _summary(result: dict) -> str:
+    """Describe a removed output by its size and first line."""
+    text = _output_text(result)
+    first_line = text.strip().splitlines()[0][:80] if text.strip() else ""
+    return f'{len(text)} characters of {result["name"]} output removed to save tokens; first line: "{first_line}"'
+
+
+def compact_history(
+    conversation_history: list[types.Content],
+    token_budget: int=HISTORY_TOKEN_BUDGET,
+    keep_recent: int=HISTORY_KEEP_RECENT,
+) -> int:
+    '''
+    Shrinks the conversation history in place before it is sent to the model again:
+    (1) outputs superseded by a later read of the same path, or a later write of a file's full content, are elided;
+    (2) outputs identical to a later output are elided; and
+    (3) while the estimated prompt is still over token_budget, the oldest remaining large outputs are summarized.
+    The initial user prompt and the most recent keep_recent contents are always kept verbatim.
+
+    Args:
+        conversation_history: Contents sent to the model on every iteration
+        token_budget: Target number of prompt tokens for the history
+        keep_recent: Number of most recent contents that are never compacted
+    Returns:
+        Number of function responses elided.
+    '''
+    protected_from = len(conversation_history) - keep_recent
+    all_results = _tool_results(conversation_history)
+    results = [
+        result for result in all_results
+        if result["content_index"] < protected_from and not _is_elided(result)
+    ]
+    elided = 0
+
+    for result in results:
+        later = [other for other in all_results if other["content_index"] > result["content_index"]]
+
+        # (1) Superseded by a later read of the same target or a later full rewrite of the same file
+        superseding = next((other for other in later if _supersedes(other, result)), None)
+        if superseding:
+            path = _normalize_path(result["args"].get(path_arguments[result["name"]]))
+            _elide(conversation_history, result, f'superseded by a later {superseding["name"]} of "{path}"')
+            elided += 1
+            continue
+
+        # (2) Identical to a later output of the same function
+        if any(other["name"] == result["name"] and other["response"] == result["response"] for other in later):
+            _elide(conversation_history, result, "identical to a later result of the same function")
+            elided += 1
+
+    # (3) Summarize the oldest outputs while the history is over budget
+    estimated_tokens = estimate_prompt_tokens(conversation_history)
+    for result in results:
+        if estimated_tokens <= token_budget:
+            break
+        if _is_elided(result) or len(result["response"]) < MIN_SUMMARIZED_CHARS:
+            continue
+        removed_chars = len(result["response"])
+        _elide(conversation_history, result, _summary(result))
+        estimated_tokens -= tokens_for_chars(removed_chars)
+        elided += 1
+
+    return elided
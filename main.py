@@ -1,32 +1,109 @@
+from __future__ import annotations # annotations name SDK types without importing the SDK at startup
+import asyncio
 import sys # interact with Python runtime → interpreter settings, arguments, system-level information
-import os # interact with operating system → files, directories, environmental variables, processes
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
+from config import env_bool, env_int, env_str, lazy_module
 from quota_tracker import *
-from functions.schemas import *
-from functions.call_function import function_schemas, call_function
+import response_cache
+import tracing
+import sessions
+from tracing import span
+from history_manager import compact_history
+from token_estimator import estimate_prompt_tokens
+from quota_scheduler import wait_for_quota, wait_for_quota_async, complete_request
+from functions.call_function import get_function_schemas, call_functions, call_functions_async, StreamingDispatcher
+from functions.tool_cache import tool_cache
 
 
-load_dotenv()
-API_KEY = os.getenv("GEMINI_API_KEY")
-AI_MODEL = os.getenv("AI_MODEL")
-SYSTEM_PROMPT = os.getenv("SYSTEM_PROMPT")
-MAX_ITERATIONS = int(os.getenv("MAX_ITERATIONS"))
+# The Gemini SDK takes most of the startup time, so it is imported on first use (e.g., not for a usage error)
+genai = lazy_module("google.genai")
+types = lazy_module("google.genai.types")
 
+API_KEY = env_str("GEMINI_API_KEY")
+AI_MODEL = env_str("AI_MODEL")
+SYSTEM_PROMPT = env_str("SYSTEM_PROMPT")
+MAX_ITERATIONS = env_int("MAX_ITERATIONS")
+STREAM_RESPONSES = env_bool("STREAM_RESPONSES")
 
-if len(sys.argv) == 1:
-    print("Error: No prompt argument provided.")
-    print("Usage: python main.py 'your prompt here' [--verbose]")
-    print("Example: python main.py 'How do I build a calculator app?'")
-    sys.exit(1)
 
-
-def get_system_prompts() -> tuple[str, bool]:
+def get_system_prompts() -> tuple[str, bool, bool, str | None]:
     args = sys.argv[1:] # index 0 is always the Python file name, so it can be ignored
+    resume_id = None
+    if "--resume" in args:
+        index = args.index("--resume")
+        resume_id = args[index + 1] if index + 1 < len(args) else None
+        del args[index:index + 2]
+    if not args and resume_id is None:
+        print("Error: No prompt argument provided.")
+        print("Usage: python main.py 'your prompt here' [--stream] [--no-cache] [--trace] [--verbose]")
+        print("       python main.py --resume <session-id> [--stream] [--no-cache] [--trace] [--verbose]")
+        print("Example: python main.py 'How do I build a calculator app?'")
+        sys.exit(1)
+
+    if "--no-cache" in args:
+        args.remove("--no-cache")
+        response_cache.set_enabled(False)
+    if "--trace" in args:
+        args.remove("--trace")
+        tracing.enable()
+    is_streaming = STREAM_RESPONSES
+    if "--stream" in args:
+        args.remove("--stream")
+        is_streaming = True
     user_prompt = " ".join(args)
-    is_verbose = bool(args[-1] == "--verbose")
-    return (user_prompt, is_verbose)
+    is_verbose = bool(args and args[-1] == "--verbose")
+    return (user_prompt, is_verbose, is_streaming, resume_id)
+
+
+def get_config() -> types.GenerateContentConfig:
+    """Return the model configuration: function declarations (tools) and system prompt."""
+    # Schemas written in functions.schemas and bunled into types.Tool() object in functions.call_function
+    return types.GenerateContentConfig(
+        tools=[get_function_schemas()],
+        system_instruction=SYSTEM_PROMPT
+    )
+
+
+def load_cached_response(
+    config: types.GenerateContentConfig,
+    conversation_history: list[types.Content]
+) -> tuple[str | None, types.GenerateContentResponse | None]:
+    '''
+    Looks up a cached response for an identical request (opt-in), which is replayed without spending quota.
+
+    Returns:
+        Tuple of the cache key (None when the cache is disabled) and the cached response (None on a miss).
+    '''
+    if not response_cache.is_enabled():
+        return (None, None)
+    with span("cache.load_response") as attributes:
+        key = response_cache.cache_key(AI_MODEL, config, conversation_history)
+        cached_response = response_cache.load_response(key)
+        attributes["hit"] = cached_response is not None
+    return (key, cached_response)
+
+
+def record_response(
+    response: types.GenerateContentResponse,
+    attributes: dict,
+    key: str | None = None
+) -> int | None:
+    '''
+    Records a response received from the model: token counts on its span, the request in the quota log,
+    and the response in the cache when key is set.
+
+    Returns:
+        Actual prompt token count, used to release the request's quota reservation.
+    '''
+    usage_metadata = response.usage_metadata
+    attributes["prompt_tokens"] = usage_metadata.prompt_token_count
+    attributes["response_tokens"] = usage_metadata.candidates_token_count
+    actual_tokens = usage_metadata.prompt_token_count
+    # Log request metrics for quota tracking
+    log_request(actual_tokens)
+    if key:
+        with span("cache.save_response"):
+            response_cache.save_response(key, response)
+    return actual_tokens
 
 
 def get_response(
@@ -34,52 +111,303 @@ def get_response(
     config: types.GenerateContentConfig, 
     conversation_history: list[types.Content]
 ) -> types.GenerateContentResponse:
-    return client.models.generate_content(
-        model=AI_MODEL,
-        config=config,
-        contents=conversation_history,
+    key, cached_response = load_cached_response(config, conversation_history)
+    if cached_response is not None:
+        return cached_response
+
+    # Throttle before sending so the request stays under the RPM/TPM limits instead of failing with a 429
+    reservation = wait_for_quota(estimate_prompt_tokens(conversation_history, config))
+    actual_tokens = None
+    try:
+        with span("model.generate_content", contents=len(conversation_history)) as attributes:
+            response = client.models.generate_content(
+                model=AI_MODEL,
+                config=config,
+                contents=conversation_history,
+            )
+            actual_tokens = record_response(response, attributes, key)
+        return response
+    finally:
+        complete_request(reservation, actual_tokens)
+
+
+async def get_response_async(
+    client: genai.Client,
+    config: types.GenerateContentConfig,
+    conversation_history: list[types.Content]
+) -> types.GenerateContentResponse:
+    """Async version of get_response using the SDK's async client (client.aio)."""
+    key, cached_response = load_cached_response(config, conversation_history)
+    if cached_response is not None:
+        return cached_response
+
+    reservation = await wait_for_quota_async(estimate_prompt_tokens(conversation_history, config))
+    actual_tokens = None
+    try:
+        with span("model.generate_content", contents=len(conversation_history)) as attributes:
+            response = await client.aio.models.generate_content(
+                model=AI_MODEL,
+                config=config,
+                contents=conversation_history,
+            )
+            actual_tokens = record_response(response, attributes, key)
+        return response
+    finally:
+        complete_request(reservation, actual_tokens)
+
+
+def add_streamed_chunk(chunk: types.GenerateContentResponse, parts: list[types.Part]) -> list[types.FunctionCall]:
+    '''
+    Prints the text of one streamed chunk as it arrives and adds the chunk's parts to parts.
+
+    Returns:
+        Function calls received in the chunk, to be started right away.
+    '''
+    function_calls = []
+    if not chunk.candidates or not chunk.candidates[0].content:
+        return function_calls
+    for part in chunk.candidates[0].content.parts or []:
+        if part.text and not part.thought:
+            print(part.text, end="", flush=True)
+            # Merge text chunks so the history holds one text part instead of many fragments
+            if parts and parts[-1].text and not parts[-1].thought:
+                parts[-1] = types.Part(text=parts[-1].text + part.text)
+                continue
+        if part.function_call:
+            function_calls.append(part.function_call)
+        parts.append(part)
+    return function_calls
+
+
+def assemble_streamed_response(
+    parts: list[types.Part],
+    usage_metadata: types.GenerateContentResponseUsageMetadata | None,
+    attributes: dict
+) -> types.GenerateContentResponse:
+    """Combine the parts and final usage metadata of a streamed response into one response, and record it."""
+    if parts and any(part.text for part in parts):
+        print()
+    response = types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=parts))],
+        usage_metadata=usage_metadata or types.GenerateContentResponseUsageMetadata(),
     )
+    record_response(response, attributes)
+    return response
 
 
-def get_function_response_parts(
-    response: types.GenerateContentResponse, 
-    user_prompt: str, 
+def get_streamed_response(
+    client: genai.Client,
+    config: types.GenerateContentConfig,
+    conversation_history: list[types.Content],
     is_verbose: bool
-) -> list[types.Part]:
+) -> tuple[types.GenerateContentResponse, list[types.Content]]:
+    '''
+    Streams a model response: text is printed as it arrives and each function call is started as soon as it is
+    received. Streamed responses are not read from or written to the response cache.
+
+    Returns:
+        Tuple of the assembled response (all parts and the final usage metadata) and the function call results.
+    '''
+    reservation = wait_for_quota(estimate_prompt_tokens(conversation_history, config))
+    response = None
+    dispatcher = StreamingDispatcher(is_verbose)
+    parts: list[types.Part] = []
+    usage_metadata = None
+    try:
+        with span("model.generate_content_stream", contents=len(conversation_history)) as attributes:
+            for chunk in client.models.generate_content_stream(
+                model=AI_MODEL,
+                config=config,
+                contents=conversation_history,
+            ):
+                usage_metadata = chunk.usage_metadata or usage_metadata
+                for function_call in add_streamed_chunk(chunk, parts):
+                    dispatcher.submit(function_call)
+            response = assemble_streamed_response(parts, usage_metadata, attributes)
+    finally:
+        complete_request(reservation, response.usage_metadata.prompt_token_count if response else None)
+        tool_function_contents = dispatcher.results()
+    return (response, tool_function_contents)
+
+
+async def get_streamed_response_async(
+    client: genai.Client,
+    config: types.GenerateContentConfig,
+    conversation_history: list[types.Content],
+    is_verbose: bool
+) -> tuple[types.GenerateContentResponse, list[types.Content]]:
+    '''
+    Async version of get_streamed_response using the SDK's async client (client.aio). Function calls run on the
+    same StreamingDispatcher; submitting a call that must wait for earlier ones (e.g., write_file) does not block
+    the event loop.
+    '''
+    reservation = await wait_for_quota_async(estimate_prompt_tokens(conversation_history, config))
+    response = None
+    dispatcher = StreamingDispatcher(is_verbose)
+    parts: list[types.Part] = []
+    usage_metadata = None
+    try:
+        with span("model.generate_content_stream", contents=len(conversation_history)) as attributes:
+            async for chunk in await client.aio.models.generate_content_stream(
+                model=AI_MODEL,
+                config=config,
+                contents=conversation_history,
+            ):
+                usage_metadata = chunk.usage_metadata or usage_metadata
+                for function_call in add_streamed_chunk(chunk, parts):
+                    await asyncio.to_thread(dispatcher.submit, function_call)
+            response = assemble_streamed_response(parts, usage_metadata, attributes)
+    finally:
+        complete_request(reservation, response.usage_metadata.prompt_token_count if response else None)
+        tool_function_contents = await asyncio.to_thread(dispatcher.results)
+    return (response, tool_function_contents)
+
+
+def log_response_metrics(
+    response: types.GenerateContentResponse,
+    user_prompt: str,
+    is_verbose: bool,
+    session_stats: dict | None = None,
+) -> None:
     if is_verbose:
         print(f"User prompt: {user_prompt}")
         print(f"Prompt tokens: {response.usage_metadata.prompt_token_count}")
         print(f"Response tokens: {response.usage_metadata.candidates_token_count}")
 
-    # Log request metrics for quota tracking
-    log_request(response.usage_metadata.prompt_token_count)
-    
+    if session_stats is not None:
+        session_stats["requests"] = session_stats.get("requests", 0) + 1
+        session_stats["prompt_tokens"] = session_stats.get("prompt_tokens", 0) + (response.usage_metadata.prompt_token_count or 0)
+        session_stats["response_tokens"] = session_stats.get("response_tokens", 0) + (response.usage_metadata.candidates_token_count or 0)
+
     if is_verbose:
         print(f"Requests per day (RPD): used {get_rpd()} out of {threshold_rpd()}")
         print(f"Requests per minute (RPM): used {get_rpm()} out of {threshold_rpm()}")
         print(f"Tokens per minute (RPM): used {get_tpm()} out of {threshold_tpm()}")
+        cache_stats = tool_cache.stats()
+        print(f"Tool cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
 
+def collect_function_response_parts(
+    tool_function_contents: list[types.Content],
+    is_verbose: bool
+) -> list[types.Part]:
     function_response_parts: list[types.Part] = []
+    for tool_function_content in tool_function_contents:
+        if not tool_function_content.parts or not tool_function_content.parts[0].function_response:
+            raise Exception("Empty function call result")
+
+        if is_verbose:
+            print(f"-> {tool_function_content.parts[0].function_response.response}")
+
+        # 4 Helper: parse function response for parts
+        function_response_parts.append(tool_function_content.parts[0])
+    if not function_response_parts:
+        raise Exception("No function responses generated, exiting.")
+
+    return function_response_parts
+
+
+def report_response(
+    response: types.GenerateContentResponse,
+    iteration: int,
+    user_prompt: str,
+    is_verbose: bool,
+    session_stats: dict | None = None,
+) -> list[types.FunctionCall]:
+    '''
+    Prints and logs a (non-streamed) model response: the model output when verbose, the request metrics,
+    and the response text when no functions were requested.
+
+    Returns:
+        Function calls requested by the model, in order.
+    '''
+    # 🔍 Debug model output (optional)
+    if is_verbose:
+        print(f"\n[Iteration {iteration}]")
+        print(f"Model candidates: {response.candidates}")
+        print(f"Function calls: {response.function_calls}")
+
+    log_response_metrics(response, user_prompt, is_verbose, session_stats)
+
     if not response.function_calls:
         print("Response:")
         print(response.text)
-    else:
-        for function_call in response.function_calls:
-            # 3 Helper: call function
-            tool_function_content = call_function(function_call, is_verbose)
-        
-            if not tool_function_content.parts or not tool_function_content.parts[0].function_response:
-                raise Exception("Empty function call result")
+        return []
+    return response.function_calls
 
-            if is_verbose:
-                print(f"-> {tool_function_content.parts[0].function_response.response}")
 
-            # 4 Helper: parse function response for parts
-            function_response_parts.append(tool_function_content.parts[0])
-        if not function_response_parts:
-            raise Exception("No function responses generated, exiting.")
+def is_final_response(response: types.GenerateContentResponse) -> bool:
+    """Return True when the model answered without requesting functions and produced a meaningful message."""
+    if response.function_calls:
+        return False # checked first: response.text warns about the function call parts it skips
+    return sessions.is_final_answer(response.text, has_function_calls=False)
 
-    return function_response_parts
+
+def begin_iteration(
+    iteration: int,
+    conversation_history: list[types.Content],
+    is_verbose: bool,
+    session_stats: dict | None = None,
+) -> None:
+    """Count the iteration and keep the prompt within the token budget by eliding stale or repeated function outputs."""
+    if session_stats is not None:
+        session_stats["iterations"] = iteration
+    with span("history.compact", contents=len(conversation_history)) as attributes:
+        elided = compact_history(conversation_history)
+        attributes["elided"] = elided
+    if is_verbose and elided:
+        print(f"History compaction: elided {elided} function response(s)")
+
+
+def end_iteration(
+    iteration: int,
+    response: types.GenerateContentResponse,
+    tool_function_contents: list[types.Content],
+    conversation_history: list[types.Content],
+    is_verbose: bool,
+    is_streaming: bool = False,
+    session: sessions.Session | None = None,
+) -> str | None:
+    '''
+    Adds the model's turn (its function calls) and the function responses to the conversation history and the session.
+
+    Returns:
+        The final response text when the model answered, otherwise None.
+    '''
+    function_response_parts = []
+    if tool_function_contents:
+        function_response_parts = collect_function_response_parts(tool_function_contents, is_verbose)
+
+    # 4 Helper: update conversation history with the model's turn (its function calls) and the function responses
+    new_contents = []
+    if response.candidates and response.candidates[0].content:
+        new_contents.append(response.candidates[0].content)
+    if function_response_parts:
+        new_contents.append(types.Content(
+            role="user", 
+            parts=function_response_parts
+        ))
+    conversation_history.extend(new_contents)
+    if session is not None:
+        session.append_iteration(new_contents)
+
+    # 4 Helper: model exits with answer; response will have text when function calls no longer needed
+    if is_final_response(response):
+        if not is_streaming: # streamed text was already printed as it arrived
+            print("Final response:")
+            print(response.text)
+        return response.text
+
+    # 4 Helper: model exists without answer; response text value will be None
+    if iteration == MAX_ITERATIONS:
+        print(f"Maximum iterations ({MAX_ITERATIONS}) reached without a final response.")
+    return None
+
+
+def report_iteration_error(iteration: int, error: Exception, session_stats: dict | None = None) -> None:
+    print(f"Error during iteration {iteration}: {error}")
+    if session_stats is not None:
+        session_stats["error"] = str(error)
 
 
 def run_agent_loop(
@@ -88,73 +416,144 @@ def run_agent_loop(
     conversation_history: list[types.Content],
     user_prompt: str,
     is_verbose: bool,
-) -> None:
-    """Run the agent loop to iteratively call the model and execute functions."""
+    session_stats: dict | None = None,
+    is_streaming: bool = False,
+    session: sessions.Session | None = None,
+) -> str | None:
+    """
+    Run the agent loop to iteratively call the model and execute functions.
+    Returns the final response text, or None when the loop ends without one. When session_stats is provided,
+    it is updated with the number of iterations, requests, token usage, and the last error (if any).
+    With is_streaming, model text is printed as it arrives and function calls start as soon as they are received.
+    When session is provided, the contents added by each completed iteration are appended to the session file.
+    """
     for iteration in range(1, MAX_ITERATIONS + 1):
         try:
-            # 2 & 4 Helper: call model with current conversation history
-            response = get_response(client, config, conversation_history)
-
-            # 🔍 Debug model output (optional)
-            if is_verbose:
-                print(f"\n[Iteration {iteration}]")
-                print(f"Model candidates: {response.candidates}")
-                print(f"Function calls: {response.function_calls}")
-
-            # 3 & 4 Helper: call function and extract function parts
-            function_response_parts = get_function_response_parts(response, user_prompt, is_verbose)
-
-            # 4 Helper: update conversation history
-            if function_response_parts:
-                conversation_history.append(types.Content(
-                    role="user", 
-                    parts=function_response_parts
-                ))
-
-            # 4 Helper: model exits with answer; response will have text when function calls no longer needed
-            if not response.function_calls:
-                # Only stop if model produced a meaningful final message
-                if response.text and "```tool_outputs" not in response.text:
-                    print("Final response:")
-                    print(response.text)
-                    return
-
-            # 4 Helper: model exists without answer; response text value will be None
-            if iteration == MAX_ITERATIONS:
-                print(f"Maximum iterations ({MAX_ITERATIONS}) reached without a final response.")
+            with span("agent.iteration", iteration=iteration):
+                begin_iteration(iteration, conversation_history, is_verbose, session_stats)
+
+                if is_streaming:
+                    if is_verbose:
+                        print(f"\n[Iteration {iteration}]")
+                    # 2 & 3 Helper: stream the model response and start function calls as they arrive
+                    response, tool_function_contents = get_streamed_response(client, config, conversation_history, is_verbose)
+                    log_response_metrics(response, user_prompt, is_verbose, session_stats)
+                else:
+                    # 2 & 4 Helper: call model with current conversation history
+                    response = get_response(client, config, conversation_history)
+                    function_calls = report_response(response, iteration, user_prompt, is_verbose, session_stats)
+
+                    # 3 Helper: call functions (independent calls run concurrently, results keep the model's order)
+                    tool_function_contents = []
+                    if function_calls:
+                        with span("agent.call_functions", calls=len(function_calls)):
+                            tool_function_contents = call_functions(function_calls, is_verbose)
+
+                final_response = end_iteration(
+                    iteration, response, tool_function_contents, conversation_history, is_verbose, is_streaming, session
+                )
+                if final_response is not None:
+                    return final_response
 
         except Exception as e:
-            print(f"Error during iteration {iteration}: {e}")
+            report_iteration_error(iteration, e, session_stats)
             break
 
-def main():
-    # Step #1: Define function declarations
+    return None
+
+
+async def run_agent_loop_async(
+    client: genai.Client,
+    config: types.GenerateContentConfig,
+    conversation_history: list[types.Content],
+    user_prompt: str,
+    is_verbose: bool,
+    session_stats: dict | None = None,
+    is_streaming: bool = False,
+    session: sessions.Session | None = None,
+) -> str | None:
+    """
+    Async version of run_agent_loop built on the SDK's async client (client.aio) and call_functions_async,
+    so a single process can drive many agent sessions concurrently.
+    """
+    for iteration in range(1, MAX_ITERATIONS + 1):
+        try:
+            with span("agent.iteration", iteration=iteration):
+                begin_iteration(iteration, conversation_history, is_verbose, session_stats)
+
+                if is_streaming:
+                    if is_verbose:
+                        print(f"\n[Iteration {iteration}]")
+                    response, tool_function_contents = await get_streamed_response_async(
+                        client, config, conversation_history, is_verbose
+                    )
+                    log_response_metrics(response, user_prompt, is_verbose, session_stats)
+                else:
+                    response = await get_response_async(client, config, conversation_history)
+                    function_calls = report_response(response, iteration, user_prompt, is_verbose, session_stats)
+
+                    tool_function_contents = []
+                    if function_calls:
+                        with span("agent.call_functions", calls=len(function_calls)):
+                            tool_function_contents = await call_functions_async(function_calls, is_verbose)
+
+                final_response = end_iteration(
+                    iteration, response, tool_function_contents, conversation_history, is_verbose, is_streaming, session
+                )
+                if final_response is not None:
+                    return final_response
+
+        except Exception as e:
+            report_iteration_error(iteration, e, session_stats)
+            break
+
+    return None
 
-    # Schemas written in functions.schemas and bunled into types.Tool() object in functions.call_function
-    available_functions = function_schemas
 
+def main():
+    # Step #1: Define function declarations
     # Step #2: Call the Gemini model
 
-    # 2a. Configure the client and model behavior
-    client = genai.Client(api_key=API_KEY)
-    tools = available_functions
-    config = types.GenerateContentConfig(
-        tools=[tools], 
-        system_instruction=SYSTEM_PROMPT
-    )
+    # 2a. Define user prompt (parsed first, so usage errors exit before the Gemini SDK is loaded)
+    user_prompt, is_verbose, is_streaming, resume_id = get_system_prompts()
 
-    # 2b. Define user prompt and initial conversation history
-    user_prompt, is_verbose = get_system_prompts()
-    conversation_history = [types.Content(
-        role="user",
-        parts=[types.Part(text=user_prompt)],
-    )]
+    # 2b. Define the initial conversation history: a new prompt, or a saved session continued where it stopped
+    session = None
+    if resume_id is not None:
+        try:
+            session, conversation_history = sessions.load_session(resume_id)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if sessions.is_finished(conversation_history):
+            print(f"Session {session.id} already has a final response:")
+            print(sessions.content_text(conversation_history[-1]))
+            return
+        user_prompt = sessions.first_prompt(conversation_history)
+        print(f"Resuming session {session.id} after iteration {session.iterations}")
+    else:
+        conversation_history = [types.Content(
+            role="user",
+            parts=[types.Part(text=user_prompt)],
+        )]
+        if sessions.SAVE_SESSIONS:
+            session = sessions.create_session(conversation_history)
+
+    # 2c. Configure the client and model behavior
+    client = genai.Client(api_key=API_KEY)
+    config = get_config()
 
     # The agent enters an iterative loop (limited by MAX_ITERATIONS) where:
-    # Step 2c: Execute model -> model response
+    # Step 2d: Execute model -> model response
     # Step 3: Execute function -> function response
     # Step 4: Execute model again -> repeat 2 & 3 for final model response
-    run_agent_loop(client, config, conversation_history, user_prompt, is_verbose)
+    final_response = run_agent_loop(
+        client, config, conversation_history, user_prompt, is_verbose, is_streaming=is_streaming, session=session
+    )
+    if final_response is None and session is not None:
+        print(f"Continue this session with: python main.py --resume {session.id}")
+    if tracing.is_enabled():
+        tracing.print_summary()
 
 
 if __name__ == "__main__":
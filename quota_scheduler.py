@@ -0,0 +1,129 @@
+from __future__ import annotations
+import time
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from tracing import span
+from token_estimator import calibrate
+from quota_tracker import get_rpd, get_minute_window, threshold_rpd, threshold_rpm, threshold_tpm
+
+
+# quota_tracker counts a request in RPM and TPM for one minute after it is logged
+WINDOW = timedelta(minutes=1)
+
+
+class QuotaExceededError(Exception):
+    """Raised when the daily request quota (RPD) is used up; waiting would not help until tomorrow."""
+
+
+class Reservation:
+    '''
+    Quota held for one model request from reserve_request until complete_request releases it.
+
+    Example:
+        reservation = wait_for_quota(estimated_tokens)
+        ... send the request ...
+        complete_request(reservation, response.usage_metadata.prompt_token_count)
+    '''
+
+    def __init__(self, planned: datetime, estimated_tokens: int, delay: float):
+        self.planned = planned # time the request may be sent
+        self.estimated_tokens = estimated_tokens
+        self.delay = delay # seconds to wait before sending
+
+
+_lock = threading.Lock()
+# Requests reserved but not yet recorded by quota_tracker
+_pending: list[Reservation] = []
+
+
+def _earliest_slot(entries: list[tuple[datetime, int]], now: datetime, limit: int, cost: int) -> datetime:
+    '''
+    Returns the earliest time from now on at which cost can be added to the one-minute window without exceeding
+    limit, assuming no other requests are made; entries leave the window one minute after their timestamp.
+
+    Args:
+        entries: (timestamp, amount) of the requests counted in the window, oldest first
+        now: Current time
+        limit: Maximum total amount in the window (e.g., threshold_rpm())
+        cost: Amount the new request adds (1 for RPM, its tokens for TPM)
+    Returns:
+        The time at which the request can be sent.
+    '''
+    total = sum(amount for _, amount in entries)
+    cost = min(cost, limit) # a single request larger than the limit waits for an empty window
+    slot = now
+    for timestamp, amount in entries:
+        if total + cost <= limit:
+            break
+        total -= amount
+        slot = max(slot, timestamp + WINDOW)
+    return slot
+
+
+def reserve_request(estimated_tokens: int) -> Reservation:
+    '''
+    Reserves quota for one model request. Raises QuotaExceededError when the daily limit (RPD) is reached.
+    The wait is computed from the same sliding one-minute window that quota_tracker measures, including requests
+    logged by other processes and requests of this process that are reserved but not yet logged.
+
+    Args:
+        estimated_tokens: Estimated prompt tokens of the request
+    Returns:
+        The reservation; its delay is the number of seconds to wait before sending the request to stay under the
+        RPM and TPM limits.
+    '''
+    with _lock:
+        if get_rpd() + len(_pending) >= threshold_rpd():
+            raise QuotaExceededError(f"Daily request limit reached: used {get_rpd()} out of {threshold_rpd()}")
+        now = datetime.now()
+        # A pending request is logged once it completes, so it stays in the window for at least a minute from now
+        entries = sorted(
+            get_minute_window()
+            + [(max(reservation.planned, now), reservation.estimated_tokens) for reservation in _pending]
+        )
+        slot = max(
+            _earliest_slot([(timestamp, 1) for timestamp, _ in entries], now, threshold_rpm(), 1),
+            _earliest_slot(entries, now, threshold_tpm(), estimated_tokens),
+        )
+        reservation = Reservation(slot, estimated_tokens, (slot - now).total_seconds())
+        _pending.append(reservation)
+        return reservation
+
+
+def complete_request(reservation: Reservation, actual_tokens: int | None) -> None:
+    '''
+    Releases a reservation once the request has finished (and was logged by quota_tracker if it succeeded), and
+    calibrates the token estimator with the real token count.
+
+    Args:
+        reservation: The reservation returned by reserve_request (or wait_for_quota)
+        actual_tokens: The prompt_token_count reported by the model, or None if the request failed
+    '''
+    with _lock:
+        if reservation in _pending:
+            _pending.remove(reservation)
+    if actual_tokens is not None:
+        calibrate(reservation.estimated_tokens, actual_tokens)
+
+
+def wait_for_quota(estimated_tokens: int) -> Reservation:
+    """Block until a request with the estimated prompt tokens fits under the RPM and TPM limits; return its reservation."""
+    with span("quota.wait", estimated_tokens=estimated_tokens) as attributes:
+        reservation = reserve_request(estimated_tokens)
+        attributes["delay_seconds"] = round(max(reservation.delay, 0), 3)
+        if reservation.delay > 0:
+            print(f"Quota scheduler: waiting {reservation.delay:.1f}s to stay under the RPM/TPM limits")
+            time.sleep(reservation.delay)
+    return reservation
+
+
+async def wait_for_quota_async(estimated_tokens: int) -> Reservation:
+    """Async version of wait_for_quota that sleeps on the event loop instead of blocking the thread."""
+    with span("quota.wait", estimated_tokens=estimated_tokens) as attributes:
+        reservation = reserve_request(estimated_tokens)
+        attributes["delay_seconds"] = round(max(reservation.delay, 0), 3)
+        if reservation.delay > 0:
+            print(f"Quota scheduler: waiting {reservation.delay:.1f}s to stay under the RPM/TPM limits")
+            await asyncio.sleep(reservation.delay)
+    return reservation
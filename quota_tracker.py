@@ -1,59 +1,232 @@
+import os
 import json
+import threading
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from tracing import span
 
+try:
+    import fcntl # POSIX file locks
+except ImportError:
+    fcntl = None
+    import msvcrt # Windows file locks
+
+
+# Append-only file to persist daily request logs, shared by every agent process on the machine. Each line is
+# either one request, ["<timestamp>", input_tokens], or a compacted summary of earlier requests on the same day,
+# {"date": "<date>", "requests": count}.
+LOG_FILE = "quota_log.jsonl"
+LOCK_FILE = f"{LOG_FILE}.lock"
+
+# Rewrite the log as a summary after this many appends so the file stays small
+COMPACT_EVERY = 500
+
+# Sliding one-minute window of (timestamp, input_tokens) with a running token total (for RPM and TPM)
+_minute_log: deque[tuple[datetime, int]] = deque()
+_minute_tokens = 0
+
+# Requests made today (for RPD); older days are dropped on rollover
+_today = datetime.now().date()
+_daily_requests = 0
 
-# File to persist daily request logs
-LOG_FILE = "quota_log.json"
+# Position up to which this process has read the shared log, and the identity of the file it was read from
+# (compaction by any process swaps in a new file)
+_offset = 0
+_file_id: tuple[int, int] | None = None
 
-# Logs to track request and token limits
-_minute_request_log = []
-_minute_input_token_log = []
-_daily_request_log = []
+_appends_since_compaction = 0
+_lock = threading.Lock()
 
 
 # ------------------------------
-# JSON loading
+# Cross-process locking
 # ------------------------------
 
-try:
-    with open(LOG_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
-        today = datetime.now().date()
-        # --- Daily usage data ---
-        _daily_request_log = [
-            datetime.fromisoformat(ts) for ts in data.get("daily_requests", [])
-            if datetime.fromisoformat(ts).date() == today
-        ]
-        # --- Minute usage data ---
+@contextmanager
+def _locked():
+    """Hold the thread lock and an exclusive lock on LOCK_FILE so only one process touches the log at a time."""
+    with _lock, open(LOCK_FILE, "a+b") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# ------------------------------
+# Log file reading and compaction
+# ------------------------------
+
+def _read_lines_reversed(path: str, block_size: int=4096):
+    """Yield the lines of a file from last to first, reading backwards in blocks."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b""
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + remainder).split(b"\n")
+            remainder = lines.pop(0) # may be the end of a line that starts in the previous block
+            for line in reversed(lines):
+                if line.strip():
+                    yield line.decode("utf-8")
+        if remainder.strip():
+            yield remainder.decode("utf-8")
+
+
+def _reset() -> None:
+    """Forget all in-memory counts before re-reading the log from scratch."""
+    global _minute_tokens, _daily_requests, _offset, _file_id
+    _minute_log.clear()
+    _minute_tokens = 0
+    _daily_requests = 0
+    _offset = 0
+    _file_id = None
+
+
+def _add_entry(entry: list | dict, one_minute_ago: datetime) -> None:
+    """Count one log entry written by any process."""
+    global _minute_tokens, _daily_requests
+    if isinstance(entry, dict):
+        if datetime.fromisoformat(entry["date"]).date() == _today:
+            _daily_requests += entry["requests"]
+        return
+    timestamp, tokens = datetime.fromisoformat(entry[0]), entry[1]
+    if timestamp.date() == _today:
+        _daily_requests += 1
+    if timestamp > one_minute_ago:
+        _minute_log.append((timestamp, tokens))
+        _minute_tokens += tokens
+
+
+def _load_logs() -> bool:
+    '''
+    Restores today's counters from the tail of the log file; entries from earlier days are never parsed.
+
+    Returns:
+        True if the file also holds entries from earlier days (and should be compacted).
+    '''
+    global _offset, _file_id
+    stat = os.stat(LOG_FILE)
+    one_minute_ago = datetime.now() - timedelta(minutes=1)
+    has_stale_entries = False
+    todays_entries = []
+    try:
+        for line in _read_lines_reversed(LOG_FILE):
+            entry = json.loads(line)
+            day = entry["date"] if isinstance(entry, dict) else entry[0]
+            if datetime.fromisoformat(day).date() != _today:
+                has_stale_entries = True
+                break
+            todays_entries.append(entry)
+    except Exception:
+        # Unreadable log; start counting from zero
+        todays_entries = []
+
+    for entry in reversed(todays_entries):
+        _add_entry(entry, one_minute_ago)
+    _offset = stat.st_size
+    _file_id = (stat.st_dev, stat.st_ino)
+    return has_stale_entries
+
+
+def _sync() -> None:
+    '''
+    Brings the in-memory counters up to date with requests logged by other processes.
+    Only bytes appended since the last sync are parsed, unless the file was compacted (replaced) in the meantime.
+    '''
+    global _offset
+    try:
+        stat = os.stat(LOG_FILE)
+    except FileNotFoundError:
+        if _file_id is not None:
+            _reset()
+        return
+
+    if (stat.st_dev, stat.st_ino) != _file_id or stat.st_size < _offset:
+        _reset()
+        if _load_logs():
+            _compact_logs()
+    elif stat.st_size > _offset:
         one_minute_ago = datetime.now() - timedelta(minutes=1)
-        _minute_request_log = [
-            datetime.fromisoformat(ts) for ts in data.get("minute_requests", [])
-            if datetime.fromisoformat(ts) > one_minute_ago
-        ]
-        _minute_input_token_log = [
-            (datetime.fromisoformat(ts), tokens)
-            for ts, tokens in data.get("minute_tokens", [])
-            if datetime.fromisoformat(ts) > one_minute_ago
-        ]
-except FileNotFoundError:
-    _daily_request_log = []
-    _minute_request_log = []
-    _minute_input_token_log = []
-except Exception:
-    _daily_request_log = []
-    _minute_request_log = []
-    _minute_input_token_log = []
-
-
-def _save_logs():
-    """Save the daily requests for persistence."""
-    data = {
-        "daily_requests": [dt.isoformat() for dt in _daily_request_log],
-        "minute_requests": [dt.isoformat() for dt in _minute_request_log],
-        "minute_tokens": [(dt.isoformat(), tokens) for dt, tokens in _minute_input_token_log],
-    }
-    with open(LOG_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f)
+        with open(LOG_FILE, "rb") as f:
+            f.seek(_offset)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1] # leave a partially written last line for the next sync
+        for line in complete.splitlines():
+            if line.strip():
+                _add_entry(json.loads(line), one_minute_ago)
+        _offset += len(complete)
+
+
+def _compact_logs() -> None:
+    """Rewrite the log as one summary line for today plus the requests still inside the one-minute window."""
+    global _appends_since_compaction, _offset, _file_id
+    lines = []
+    older_requests = _daily_requests - len(_minute_log)
+    if older_requests > 0:
+        lines.append(json.dumps({"date": _today.isoformat(), "requests": older_requests}))
+    lines.extend(json.dumps([dt.isoformat(), tokens]) for dt, tokens in _minute_log)
+
+    temp_file = f"{LOG_FILE}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
+    os.replace(temp_file, LOG_FILE) # atomic swap, readers never see a half-written log
+    stat = os.stat(LOG_FILE)
+    _offset = stat.st_size
+    _file_id = (stat.st_dev, stat.st_ino)
+    _appends_since_compaction = 0
+
+
+def _append_log(date_time: datetime, input_tokens: int) -> None:
+    """Persist a single request as one appended line. The caller holds the file lock and has just synced."""
+    global _offset, _file_id, _appends_since_compaction
+    with open(LOG_FILE, "ab") as f:
+        f.write((json.dumps([date_time.isoformat(), input_tokens]) + "\n").encode("utf-8"))
+        _offset = f.tell()
+        stat = os.fstat(f.fileno())
+        _file_id = (stat.st_dev, stat.st_ino)
+    _appends_since_compaction += 1
+    if _appends_since_compaction >= COMPACT_EVERY:
+        _compact_logs()
+
+
+# ------------------------------
+# Sliding windows
+# ------------------------------
+
+def _expire(now: datetime) -> None:
+    """Drop entries older than one minute and reset the daily count when the date changes."""
+    global _minute_tokens, _today, _daily_requests
+    one_minute_ago = now - timedelta(minutes=1)
+    while _minute_log and _minute_log[0][0] <= one_minute_ago:
+        _minute_tokens -= _minute_log.popleft()[1]
+    if now.date() != _today:
+        _today = now.date()
+        _daily_requests = 0
+
+
+@contextmanager
+def _current_usage():
+    """Lock the shared log, fold in other processes' requests, and expire old entries."""
+    with _locked():
+        now = datetime.now()
+        _expire(now) # roll over to a new day before counting entries appended since the last sync
+        _sync()
+        _expire(now)
+        yield
+
 
 # ------------------------------
 # Logging function
@@ -66,48 +239,52 @@ def log_request(input_tokens: int) -> None:
     requests per minute (RPM), input tokens per minute (TPM), and requests per day (RPD).
 
     This is useful for monitoring usage, enforcing limits, and verbose logging of
-    API consumption during AI agent sessions.
+    API consumption during AI agent sessions. Safe to call from several threads and processes at once.
 
     Args:
         input_tokens: The input tokens from a successful request to AI model.
     Returns:
         Not applicable.
     '''
-    date_time = datetime.now()
-
-    # --- Minute-based metrics ---
-    _minute_request_log.append(date_time)
-    _minute_input_token_log.append((date_time, input_tokens))
+    global _minute_tokens, _daily_requests
+    input_tokens = input_tokens or 0
 
-    # Remove entries older than one minute (for RPM and TPM)
-    one_minute_ago = date_time - timedelta(minutes=1)
-    _minute_request_log[:] = [dt for dt in _minute_request_log if dt > one_minute_ago]
-    _minute_input_token_log[:] = [(dt, tokens) for dt, tokens in _minute_input_token_log if dt > one_minute_ago]
+    with span("quota.log_request"), _current_usage():
+        date_time = datetime.now()
 
-    # --- Daily metrics ---
-    _daily_request_log.append(date_time)
+        # --- Minute-based metrics ---
+        _minute_log.append((date_time, input_tokens))
+        _minute_tokens += input_tokens
 
-    # Remove entries older than one day (for RPD)
-    today = date_time.date()
-    _daily_request_log[:] = [dt for dt in _daily_request_log if dt.date() == today]
+        # --- Daily metrics ---
+        _daily_requests += 1
 
-    # --- Save to daily log ---
-    _save_logs()
+        # --- Save to daily log ---
+        _append_log(date_time, input_tokens)
 
 
 def get_rpd() -> int:
     """Return number of requests in the same day."""
-    return len(_daily_request_log)
+    with _current_usage():
+        return _daily_requests
 
 
 def get_rpm() -> int:
     """Return number of requests in the last 60 seconds."""
-    return len(_minute_request_log)
+    with _current_usage():
+        return len(_minute_log)
 
 
 def get_tpm() -> int:
     """Return number of input tokens in the last 60 seconds."""
-    return sum(tokens for dt, tokens in _minute_input_token_log)
+    with _current_usage():
+        return _minute_tokens
+
+
+def get_minute_window() -> list[tuple[datetime, int]]:
+    """Return (timestamp, input_tokens) of each request in the last 60 seconds, oldest first."""
+    with _current_usage():
+        return list(_minute_log)
 
 
 def threshold_rpd() -> int:
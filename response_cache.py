@@ -0,0 +1,105 @@
+from __future__ import annotations
+import os
+import json
+import time
+import hashlib
+from config import env_bool, env_int, env_str, lazy_module
+
+
+types = lazy_module("google.genai.types") # the SDK is imported on first use
+# Opt-in: model responses are only cached when RESPONSE_CACHE=true
+RESPONSE_CACHE = env_bool("RESPONSE_CACHE")
+RESPONSE_CACHE_DIR = env_str("RESPONSE_CACHE_DIR", os.path.join(".cache", "responses"))
+RESPONSE_CACHE_TTL = env_int("RESPONSE_CACHE_TTL", 86400) # seconds
+RESPONSE_CACHE_MAX_ENTRIES = env_int("RESPONSE_CACHE_MAX_ENTRIES", 1000)
+
+_enabled = RESPONSE_CACHE
+
+
+def is_enabled() -> bool:
+    """Return True if model responses should be read from and written to the cache."""
+    return _enabled
+
+
+def set_enabled(enabled: bool) -> None:
+    """Turn the cache on or off for this process (e.g., to bypass it with --no-cache)."""
+    global _enabled
+    _enabled = enabled
+
+
+def cache_key(
+    model: str,
+    config: types.GenerateContentConfig,
+    conversation_history: list[types.Content]
+) -> str:
+    '''
+    Returns a stable hash of everything that determines a model response.
+
+    Args:
+        model: Model name
+        config: Model configuration, including the system prompt and tool schemas
+        conversation_history: Contents sent to the model
+    Returns:
+        Hex digest used as the cache file name.
+    '''
+    request = {
+        "model": model,
+        "config": config.model_dump(mode="json", exclude_none=True),
+        "contents": [content.model_dump(mode="json", exclude_none=True) for content in conversation_history],
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(RESPONSE_CACHE_DIR, f"{key}.json")
+
+
+def load_response(key: str) -> types.GenerateContentResponse | None:
+    '''
+    Returns the cached response for a key, or None if it is missing or older than RESPONSE_CACHE_TTL.
+
+    Args:
+        key: Value returned by cache_key
+    Returns:
+        The cached response or None.
+    '''
+    path = _cache_path(key)
+    try:
+        if time.time() - os.path.getmtime(path) > RESPONSE_CACHE_TTL:
+            os.remove(path)
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return types.GenerateContentResponse.model_validate_json(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def save_response(key: str, response: types.GenerateContentResponse) -> None:
+    '''
+    Stores a response under a key and evicts the oldest entries beyond RESPONSE_CACHE_MAX_ENTRIES.
+
+    Args:
+        key: Value returned by cache_key
+        response: Model response to store
+    '''
+    os.makedirs(RESPONSE_CACHE_DIR, exist_ok=True)
+    path = _cache_path(key)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(response.model_dump_json(exclude_none=True))
+    os.replace(temp_path, path) # atomic, concurrent readers never see a partial entry
+    _evict()
+
+
+def _evict() -> None:
+    """Delete the least recently written entries while the cache holds more than RESPONSE_CACHE_MAX_ENTRIES."""
+    with os.scandir(RESPONSE_CACHE_DIR) as entries:
+        files = [(entry.stat().st_mtime, entry.path) for entry in entries if entry.name.endswith(".json")]
+    if len(files) <= RESPONSE_CACHE_MAX_ENTRIES:
+        return
+    files.sort()
+    for _, path in files[:len(files) - RESPONSE_CACHE_MAX_ENTRIES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
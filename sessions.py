@@ -0,0 +1,170 @@
+from __future__ import annotations
+import os
+import re
+import json
+import time
+import secrets
+from config import env_bool, env_str, lazy_module
+from tracing import span
+
+
+types = lazy_module("google.genai.types") # the SDK is imported on first use
+SAVE_SESSIONS = env_bool("SAVE_SESSIONS", True)
+SESSIONS_DIR = env_str("SESSIONS_DIR", ".sessions")
+SESSION_ID = re.compile(r"[A-Za-z0-9_-]+") # ids are file names inside SESSIONS_DIR, never paths
+
+
+class Session:
+    '''
+    Append-only record of one conversation, stored as .sessions/<id>.jsonl with one line per types.Content:
+    {"iteration": N, "contents": M, "content": {...}}, where M is the number of contents recorded for iteration N.
+    The initial prompt is iteration 0 and the contents added by an agent iteration are appended together once the
+    iteration completes; an iteration with fewer than M lines (the process died mid-write) is dropped on load.
+
+    Example:
+        session = create_session(conversation_history)
+        session.append_iteration([model_content, function_response_content])
+    '''
+
+    def __init__(self, session_id: str, iterations: int=0):
+        self.id = session_id
+        self.path = session_path(session_id)
+        self.iterations = iterations # last completed iteration
+
+    def _write(self, contents: list[types.Content], iteration: int) -> None:
+        with span("io.session_append", contents=len(contents)):
+            lines = [
+                json.dumps(
+                    {
+                        "iteration": iteration,
+                        "contents": len(contents),
+                        "content": content.model_dump(mode="json", exclude_none=True),
+                    },
+                    separators=(",", ":"),
+                )
+                for content in contents
+            ]
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{line}\n" for line in lines))
+
+    def append_iteration(self, contents: list[types.Content]) -> None:
+        """Record the contents added to the conversation by one completed agent iteration."""
+        self.iterations += 1
+        self._write(contents, self.iterations)
+
+
+def session_path(session_id: str) -> str:
+    if not SESSION_ID.fullmatch(session_id):
+        raise ValueError(f'Invalid session id "{session_id}"; expected letters, digits, "-" and "_"')
+    return os.path.join(SESSIONS_DIR, f"{session_id}.jsonl")
+
+
+def check_record(record) -> None:
+    """Raise ValueError unless record has the shape written by Session._write."""
+    if not (
+        isinstance(record, dict)
+        and isinstance(record.get("iteration"), int)
+        and isinstance(record.get("contents"), int)
+        and isinstance(record.get("content"), dict)
+    ):
+        raise ValueError("not a session record")
+
+
+def create_session(conversation_history: list[types.Content]) -> Session:
+    '''
+    Starts a new session file holding the initial conversation history.
+
+    Args:
+        conversation_history: Contents before the first iteration (the user prompt)
+    Returns:
+        The new session; its id is a timestamp plus a random suffix (e.g., 20250101-120000-1a2b3c).
+    '''
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+    session = Session(f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}")
+    session._write(conversation_history, 0)
+    return session
+
+
+def load_session(session_id: str) -> tuple[Session, list[types.Content]]:
+    '''
+    Reads a session back for --resume. An iteration that was only partly written (the process died while
+    writing it) is dropped and cut from the file, so the conversation resumes after the last complete iteration.
+
+    Args:
+        session_id: Id printed when the session was created
+    Returns:
+        Tuple of the session, positioned after its last completed iteration, and the conversation history.
+    Raises:
+        ValueError: If the session id is invalid, the session does not exist, or a line other than the last one
+            is malformed.
+    '''
+    path = session_path(session_id)
+    if not os.path.isfile(path):
+        raise ValueError(f'Session "{session_id}" not found in "{SESSIONS_DIR}"')
+
+    with open(path, "rb") as f:
+        data = f.read()
+    lines = data.splitlines(keepends=True)
+    records = []
+    ends = [] # file offset after each record
+    offset = 0
+    for index, line in enumerate(lines):
+        offset += len(line)
+        try:
+            if not line.endswith(b"\n"):
+                raise ValueError("incomplete line")
+            record = json.loads(line)
+            check_record(record)
+            records.append(record)
+            ends.append(offset)
+        except ValueError:
+            if index == len(lines) - 1:
+                break
+            raise ValueError(f'Session "{session_id}" is corrupted at line {index + 1}')
+
+    # Only the last iteration can be incomplete, since each iteration is appended after the previous one
+    if records:
+        last_iteration = records[-1]["iteration"]
+        written = sum(1 for record in records if record["iteration"] == last_iteration)
+        if written < records[-1]["contents"]:
+            records = records[:len(records) - written]
+    # Cut the partial iteration, so new iterations are appended after complete lines
+    size = ends[len(records) - 1] if records else 0
+    if size < len(data):
+        os.truncate(path, size)
+
+    try:
+        conversation_history = [types.Content.model_validate(record["content"]) for record in records]
+    except ValueError as e: # pydantic's ValidationError
+        raise ValueError(f'Session "{session_id}" has an invalid content: {e}') from e
+    iterations = records[-1]["iteration"] if records else 0
+    if not conversation_history:
+        raise ValueError(f'Session "{session_id}" is empty')
+    return (Session(session_id, iterations), conversation_history)
+
+
+def first_prompt(conversation_history: list[types.Content]) -> str:
+    """Return the text of the user prompt that started the conversation."""
+    parts = conversation_history[0].parts or []
+    return " ".join(part.text for part in parts if part.text)
+
+
+def content_text(content: types.Content) -> str:
+    """Return the answer text of a content, as response.text does: its text parts without thoughts."""
+    return "".join(part.text for part in content.parts or [] if part.text and not part.thought)
+
+
+def is_final_answer(text: str | None, has_function_calls: bool) -> bool:
+    """Return True when the model answered without requesting functions and produced a meaningful message."""
+    if has_function_calls:
+        return False
+    return bool(text) and "```tool_outputs" not in text
+
+
+def is_finished(conversation_history: list[types.Content]) -> bool:
+    """Return True if the conversation ends with a final model answer, judged as the agent loop judges a response."""
+    last_content = conversation_history[-1]
+    if last_content.role != "model":
+        return False
+    has_function_calls = any(part.function_call for part in last_content.parts or [])
+    return is_final_answer(content_text(last_content), has_function_calls)
@@ -0,0 +1,595 @@
+import io
+import os
+import json
+import sys
+import time
+import asyncio
+import threading
+import contextlib
+import shutil
+import subprocess
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import sessions
+import history_manager
+import quota_tracker
+import quota_scheduler
+from token_estimator import estimate_prompt_tokens
+from google.genai import types
+from functions import call_function as call_function_module
+from functions import write_file as write_file_module
+from functions import run_python_file as run_python_file_module
+from functions import search_files as search_files_module
+from functions.get_file_content import get_file_content
+from functions.get_files_info import get_files_info
+from functions.tool_cache import call_cached, tool_cache
+from functions.call_function import call_functions, StreamingDispatcher
+from functions.python_worker_pool import PythonWorkerPool
+from functions.utils import root_dir
+from functions.write_file import apply_edits, apply_unified_diff, write_files
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = datetime(2025, 1, 1, 12, 0, 0)
+
+    def advance(self, seconds: float) -> None:
+        self.now += timedelta(seconds=seconds)
+
+    def datetime_class(self):
+        clock = self
+
+        class FakeDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.now
+
+        return FakeDatetime
+
+
+class TestQuotaScheduler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.clock = FakeClock()
+        fake_datetime = self.clock.datetime_class()
+        log_file = os.path.join(self.directory, "quota_log.jsonl")
+        patches = [
+            mock.patch.object(quota_tracker, "datetime", fake_datetime),
+            mock.patch.object(quota_scheduler, "datetime", fake_datetime),
+            mock.patch.object(quota_tracker, "LOG_FILE", log_file),
+            mock.patch.object(quota_tracker, "LOCK_FILE", f"{log_file}.lock"),
+            mock.patch.object(quota_tracker, "_today", self.clock.now.date()),
+            mock.patch.object(quota_scheduler, "threshold_rpd", lambda: 1000),
+            mock.patch.object(quota_scheduler, "calibrate", lambda estimated, actual: None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        quota_tracker._reset()
+        quota_scheduler._pending.clear()
+        self.addCleanup(quota_tracker._reset)
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def send(self, tokens: int, latency: float) -> None:
+        """Wait as the agent would, check the limits at send time, then log the request after the model latency."""
+        reservation = quota_scheduler.reserve_request(tokens)
+        self.clock.advance(max(reservation.delay, 0))
+        self.assertLess(quota_tracker.get_rpm(), quota_scheduler.threshold_rpm())
+        self.assertLessEqual(quota_tracker.get_tpm() + tokens, quota_scheduler.threshold_tpm())
+        self.clock.advance(latency)
+        quota_tracker.log_request(tokens)
+        quota_scheduler.complete_request(reservation, tokens)
+        self.assertLessEqual(quota_tracker.get_rpm(), quota_scheduler.threshold_rpm())
+        self.assertLessEqual(quota_tracker.get_tpm(), quota_scheduler.threshold_tpm())
+
+    def test_sequential_requests_stay_under_rpm(self):
+        for _ in range(12):
+            self.send(100, latency=2)
+
+    def test_sequential_requests_stay_under_tpm(self):
+        with mock.patch.object(quota_scheduler, "threshold_tpm", lambda: 1000):
+            for _ in range(6):
+                self.send(400, latency=1)
+
+    def test_waits_for_oldest_request_to_leave_window(self):
+        for _ in range(quota_scheduler.threshold_rpm()):
+            self.send(100, latency=0)
+        self.clock.advance(12)
+        self.assertAlmostEqual(quota_scheduler.reserve_request(100).delay, 48)
+
+    def test_pending_requests_count_toward_limit(self):
+        delays = [quota_scheduler.reserve_request(100).delay for _ in range(quota_scheduler.threshold_rpm() + 1)]
+        self.assertEqual(delays[:-1], [0] * quota_scheduler.threshold_rpm())
+        self.assertAlmostEqual(delays[-1], 60)
+
+    def test_complete_releases_its_own_reservation(self):
+        with mock.patch.object(quota_scheduler, "threshold_rpm", lambda: 1):
+            first = quota_scheduler.reserve_request(100)
+            second = quota_scheduler.reserve_request(100)
+        self.assertAlmostEqual(second.delay, 60)
+        quota_scheduler.complete_request(second, None)
+        self.assertEqual(quota_scheduler._pending, [first])
+        quota_scheduler.complete_request(first, None)
+        self.assertEqual(quota_scheduler._pending, [])
+
+
+class TestPatches(unittest.TestCase):
+    def test_edits_replace_unique_text(self):
+        self.assertEqual(apply_edits("a = 1\nb = 2\n", [{"search": "b = 2", "replace": "b = 3"}]), "a = 1\nb = 3\n")
+
+    def test_edits_reject_missing_or_ambiguous_text(self):
+        with self.assertRaises(ValueError):
+            apply_edits("a = 1\n", [{"search": "b = 2", "replace": ""}])
+        with self.assertRaises(ValueError):
+            apply_edits("x\nx\n", [{"search": "x", "replace": "y"}])
+
+    def test_edits_keep_crlf_line_endings(self):
+        result = apply_edits("a\r\nb\r\nc\r\n", [{"search": "a\nb\n", "replace": "a\nB\n"}])
+        self.assertEqual(result, "a\r\nB\r\nc\r\n")
+
+    def test_diff_applies_hunks(self):
+        text = "".join(f"line {number}\n" for number in range(1, 11))
+        diff = "--- a/f.txt\n+++ b/f.txt\n@@ -2,3 +2,3 @@\n line 2\n-line 3\n+line three\n line 4\n@@ -8,2 +8,3 @@\n line 8\n+line 8.5\n line 9\n"
+        result = apply_unified_diff(text, diff)
+        self.assertIn("line 2\nline three\nline 4\n", result)
+        self.assertIn("line 8\nline 8.5\nline 9\n", result)
+
+    def test_diff_uses_nearest_match_when_line_numbers_are_off(self):
+        text = "a\nb\nc\nd\n"
+        self.assertEqual(apply_unified_diff(text, "@@ -1,2 +1,2 @@\n c\n-d\n+D\n"), "a\nb\nc\nD\n")
+
+    def test_diff_keeps_crlf_line_endings(self):
+        result = apply_unified_diff("a\r\nb\r\nc\r\n", "@@ -1,3 +1,3 @@\n a\n-b\n+B\n c\n")
+        self.assertEqual(result, "a\r\nB\r\nc\r\n")
+
+    def test_diff_without_newline_at_end_of_file(self):
+        result = apply_unified_diff("a\nb", "@@ -1,2 +1,2 @@\n a\n-b\n\\ No newline at end of file\n+c\n\\ No newline at end of file\n")
+        self.assertEqual(result, "a\nc")
+
+    def test_diff_rejects_mismatched_hunk(self):
+        with self.assertRaises(ValueError):
+            apply_unified_diff("a\nb\n", "@@ -1,1 +1,1 @@\n-x\n+y\n")
+
+
+class TestWriteFiles(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=os.path.join(root_dir(), "calculator"))
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.working_directory = os.path.relpath(self.directory, root_dir())
+        with open(os.path.join(self.directory, "existing.txt"), "w") as f:
+            f.write("original\n")
+        os.mkdir(os.path.join(self.directory, "pkg"))
+
+    def read(self, name: str) -> str:
+        with open(os.path.join(self.directory, name)) as f:
+            return f.read()
+
+    def test_writes_all_files(self):
+        result = write_files(self.working_directory, [
+            {"file_path": "new/a.txt", "content": "a\n"},
+            {"file_path": "existing.txt", "edits": [{"search": "original", "replace": "changed"}]},
+        ])
+        self.assertNotIn("Error", result)
+        self.assertEqual(self.read("new/a.txt"), "a\n")
+        self.assertEqual(self.read("existing.txt"), "changed\n")
+
+    def test_invalid_file_writes_nothing(self):
+        result = write_files(self.working_directory, [
+            {"file_path": "zz_new.txt", "content": "hello"},
+            {"file_path": "pkg", "content": "oops"},
+        ])
+        self.assertTrue(result.startswith("Error: No files were written"))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "zz_new.txt")))
+
+    def test_failed_rename_restores_written_files(self):
+        real_replace = os.replace
+        calls = []
+
+        def failing_replace(source, target):
+            calls.append(target)
+            if len(calls) == 2:
+                raise OSError("disk full")
+            return real_replace(source, target)
+
+        with mock.patch.object(write_file_module.os, "replace", failing_replace):
+            result = write_files(self.working_directory, [
+                {"file_path": "existing.txt", "content": "changed\n"},
+                {"file_path": "deep/new.txt", "content": "new\n"},
+            ])
+        self.assertTrue(result.startswith("Error: No files were written"))
+        self.assertEqual(self.read("existing.txt"), "original\n")
+        self.assertEqual(sorted(os.listdir(self.directory)), ["existing.txt", "pkg"])
+
+
+@unittest.skipUnless(hasattr(os, "fork") and sys.platform != "win32", "the worker pool needs fork")
+class TestPythonWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.pool = PythonWorkerPool(1)
+        self.addCleanup(self.pool.close)
+
+    def run_both(self, source: str) -> tuple[tuple[str, str, int], tuple[str, str, int]]:
+        with open(os.path.join(self.directory, "script.py"), "w") as f:
+            f.write(source)
+        process = subprocess.run(["python", "script.py"], cwd=self.directory, capture_output=True, text=True)
+        expected = (process.stdout, process.stderr, process.returncode)
+        return self.pool.run(self.directory, "script.py", [], timeout=10), expected
+
+    def test_workers_start_with_the_pool(self):
+        self.assertEqual(len(self.pool._workers), 1)
+        self.assertIsNone(self.pool._workers[0].poll())
+
+    def test_traceback_matches_plain_python(self):
+        output, expected = self.run_both("def fail():\n    raise ValueError('boom')\n\nfail()\n")
+        self.assertEqual(output, expected)
+        self.assertNotIn("runpy", output[1])
+        self.assertNotIn("python_worker", output[1])
+
+    def test_syntax_error_matches_plain_python(self):
+        output, expected = self.run_both("x = (\n")
+        self.assertEqual(output, expected)
+
+
+@unittest.skipIf(run_python_file_module.resource is None, "resource limits need the resource module")
+class TestResourceLimits(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=os.path.join(root_dir(), "calculator"))
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.working_directory = os.path.relpath(self.directory, root_dir())
+        with open(os.path.join(self.directory, "limits.py"), "w") as f:
+            f.write("import sys, resource\nprint(resource.getrlimit(resource.RLIMIT_AS)[0], resource.getrlimit(resource.RLIMIT_CPU)[0], sys.argv[1:])\n")
+        patches = [
+            mock.patch.object(run_python_file_module, "RUN_MEMORY_LIMIT_MB", 512),
+            mock.patch.object(run_python_file_module, "RUN_CPU_LIMIT", 7),
+            mock.patch.object(run_python_file_module, "get_worker_pool", lambda: None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.expected = f"STDOUT: {512 * 1024 * 1024} 7 ['a b', '-c']"
+
+    def test_limits_apply_to_script(self):
+        result = run_python_file_module.run_python_file(self.working_directory, "limits.py", ["a b", "-c"])
+        self.assertEqual(result, self.expected)
+
+    def test_limits_apply_to_async_script(self):
+        result = asyncio.run(run_python_file_module.run_python_file_async(self.working_directory, "limits.py", ["a b", "-c"]))
+        self.assertEqual(result, self.expected)
+
+    def test_no_wrapper_without_limits(self):
+        with mock.patch.object(run_python_file_module, "RUN_MEMORY_LIMIT_MB", 0), \
+                mock.patch.object(run_python_file_module, "RUN_CPU_LIMIT", 0):
+            self.assertEqual(run_python_file_module.limited_command(["python", "x.py"]), ["python", "x.py"])
+
+
+class TestSessions(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.sessions_dir = os.path.join(self.directory, "sessions")
+        patch = mock.patch.object(sessions, "SESSIONS_DIR", self.sessions_dir)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def content(self, role: str, text: str | None=None, function_call: bool=False) -> types.Content:
+        parts = []
+        if text is not None:
+            parts.append(types.Part(text=text))
+        if function_call:
+            parts.append(types.Part(function_call=types.FunctionCall(name="get_files_info", args={})))
+        return types.Content(role=role, parts=parts)
+
+    def test_is_finished_matches_final_response(self):
+        prompt = self.content("user", "prompt")
+        self.assertTrue(sessions.is_finished([prompt, self.content("model", "Done.")]))
+        self.assertFalse(sessions.is_finished([prompt, self.content("model", "")]))
+        self.assertFalse(sessions.is_finished([prompt, self.content("model", "```tool_outputs\n{}\n```")]))
+        self.assertFalse(sessions.is_finished([prompt, self.content("model", "Let me look.", function_call=True)]))
+        self.assertFalse(sessions.is_finished([prompt, self.content("user", "result")]))
+
+    def test_resume_drops_partial_iteration(self):
+        session = sessions.create_session([self.content("user", "prompt")])
+        session.append_iteration([self.content("model", function_call=True), self.content("user", "result")])
+        complete_size = os.path.getsize(session.path)
+        # The process died while writing iteration 2: one of its two lines and part of the next one were written
+        line = json.dumps({"iteration": 2, "contents": 2, "content": self.content("model", function_call=True).model_dump(mode="json")})
+        with open(session.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n" + line[:20])
+
+        loaded, history = sessions.load_session(session.id)
+        self.assertEqual((loaded.iterations, len(history)), (1, 3))
+        self.assertEqual(os.path.getsize(session.path), complete_size)
+
+        loaded.append_iteration([self.content("model", "Done.")])
+        loaded, history = sessions.load_session(session.id)
+        self.assertEqual((loaded.iterations, len(history)), (2, 4))
+        self.assertTrue(sessions.is_finished(history))
+
+    def test_malformed_records_raise_value_error(self):
+        os.makedirs(self.sessions_dir)
+        good = json.dumps({"iteration": 0, "contents": 1, "content": {"role": "user", "parts": [{"text": "prompt"}]}})
+        for bad in ('{"iteration": 0}', "[]", "5", '{"iteration": 0, "contents": 1, "content": {"parts": 3}}'):
+            with open(os.path.join(self.sessions_dir, "bad.jsonl"), "w", encoding="utf-8") as f:
+                f.write(f"{bad}\n{good}\n")
+            with self.subTest(record=bad), self.assertRaises(ValueError):
+                sessions.load_session("bad")
+
+    def test_rejects_session_ids_outside_sessions_dir(self):
+        outside = os.path.join(self.directory, "x.jsonl")
+        with open(outside, "w", encoding="utf-8") as f:
+            f.write("keep me")
+        for session_id in ("../x", "/tmp/x", "a/b", ""):
+            with self.subTest(session_id=session_id), self.assertRaises(ValueError):
+                sessions.load_session(session_id)
+        with open(outside, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "keep me")
+
+
+class TestSearchIndex(unittest.TestCase):
+    files = {
+        "calc.py": "def evaluate_columns(expression):\n    return run_columns(expression)\n",
+        "pkg/render.py": "def render(expression, result):\n    return format_number(result)\n",
+        "notes.txt": "Evaluate x+1 before y.\n",
+    }
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=os.path.join(root_dir(), "calculator"))
+        self.addCleanup(shutil.rmtree, self.directory)
+        for path, text in self.files.items():
+            os.makedirs(os.path.join(self.directory, os.path.dirname(path)), exist_ok=True)
+            with open(os.path.join(self.directory, path), "w", encoding="utf-8") as f:
+                f.write(text)
+        patch = mock.patch.object(search_files_module, "SEARCH_INDEX_DIR", os.path.join(self.directory, ".cache"))
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.index = search_files_module.SearchIndex(self.directory)
+        self.index.refresh()
+
+    def test_candidates_include_every_matching_file(self):
+        for query in ("evaluate", "evaluate_columns", "columns(", "(expression)", "_col", "x+1", "n(exp", "def render(", "e", "zzz", "+"):
+            expected = {path for path, text in self.files.items() if query.lower() in text.lower()}
+            with self.subTest(query=query):
+                self.assertLessEqual(expected, self.index.candidates(query))
+
+    def test_whole_tokens_are_looked_up_exactly(self):
+        self.assertEqual(self.index.candidates("(evaluate)"), {"notes.txt"})
+        self.assertEqual(self.index.candidates(" render("), {"pkg/render.py"})
+        self.assertEqual(self.index.candidates("olumn"), {"calc.py"})
+        self.assertEqual(self.index.candidates("(olumn"), set())
+
+    def test_oversized_files_are_searched(self):
+        path = os.path.join(self.directory, "big.log")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("filler line\n" * 100 + "needle_in_big_file\n")
+        with mock.patch.object(search_files_module, "MAX_INDEXED_FILE_SIZE", 1000):
+            self.index.update_file(path)
+            self.assertIn("big.log", self.index.candidates("needle_in_big_file"))
+            self.assertIn("big.log", self.index.candidates("(evaluate)"))
+            working_directory = os.path.relpath(self.directory, root_dir())
+            with mock.patch.object(search_files_module, "get_index", lambda base_path: self.index):
+                result = search_files_module.search_files(working_directory, "needle_in_big_file")
+        self.assertEqual(result, "big.log:101: needle_in_big_file")
+
+    def test_refresh_scans_only_when_the_tree_may_have_changed(self):
+        with mock.patch.object(self.index, "scan") as scan:
+            self.index.refresh()
+            scan.assert_not_called()
+            self.index.stale = True
+            self.index.refresh()
+            scan.assert_called_once()
+
+    def test_written_files_are_indexed_without_a_scan(self):
+        path = os.path.join(self.directory, "new.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("unique_name = 1\n")
+        self.index.update_file(path)
+        with mock.patch.object(self.index, "scan") as scan:
+            self.index.refresh()
+            scan.assert_not_called()
+        self.assertEqual(self.index.candidates("unique_name"), {"new.py"})
+        os.remove(path)
+        self.index.update_file(path)
+        self.assertEqual(self.index.candidates("unique_name"), set())
+        self.assertNotIn("uni", self.index.trigrams)
+
+
+class TestHistoryManager(unittest.TestCase):
+    def history(self, *calls: tuple[str, dict, str]) -> list[types.Content]:
+        """Build a conversation with one model turn and one function response per (name, args, result) call."""
+        history = [types.Content(role="user", parts=[types.Part(text="prompt")])]
+        for name, args, result in calls:
+            history.append(types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name=name, args=args))]))
+            history.append(types.Content(role="user", parts=[types.Part.from_function_response(name=name, response={"result": result})]))
+        return history
+
+    def output(self, history: list[types.Content], index: int) -> str:
+        return history[index].parts[0].function_response.response["result"]
+
+    def compact(self, history: list[types.Content], **options) -> int:
+        return history_manager.compact_history(history, **{"token_budget": 100000, "keep_recent": 0, **options})
+
+    def test_full_rewrite_supersedes_read(self):
+        history = self.history(
+            ("get_file_content", {"file_path": "a.py"}, "x = 1\n"),
+            ("write_file", {"file_path": "a.py", "content": "x = 2\n"}, 'Successfully wrote to "a.py"'),
+        )
+        self.assertEqual(self.compact(history), 1)
+        self.assertTrue(self.output(history, 2).startswith("[Elided: superseded by a later write_file"))
+
+    def test_patches_and_failed_writes_keep_read(self):
+        for name, args, result in (
+            ("write_file", {"file_path": "a.py", "edits": [{"search": "x = 1", "replace": "x = 2"}]}, 'Successfully wrote to "a.py"'),
+            ("write_file", {"file_path": "a.py", "diff": "@@ -1 +1 @@\n-x = 1\n+x = 2\n"}, 'Successfully wrote to "a.py"'),
+            ("write_file", {"file_path": "a.py", "content": "x = 2\n"}, "Error: Cannot write to \"a.py\""),
+            ("write_files", {"files": [{"file_path": "a.py", "content": "x = 2\n"}]}, "Error: No files were written"),
+        ):
+            history = self.history(("get_file_content", {"file_path": "a.py"}, "x = 1\ny = 2\n"), (name, args, result))
+            with self.subTest(args=args, result=result):
+                self.assertEqual(self.compact(history), 0)
+                self.assertEqual(self.output(history, 2), "x = 1\ny = 2\n")
+
+    def test_reread_supersedes_read(self):
+        history = self.history(
+            ("get_file_content", {"file_path": "./a.py"}, "x = 1\n"),
+            ("get_file_content", {"file_path": "b.py"}, "y = 1\n"),
+            ("get_file_content", {"file_path": "a.py", "start_line": 2}, "z = 1\n"),
+            ("get_file_content", {"file_path": "a.py"}, "x = 2\n"),
+        )
+        self.assertEqual(self.compact(history), 1)
+        self.assertTrue(self.output(history, 2).startswith('[Elided: superseded by a later get_file_content of "a.py"'))
+        self.assertEqual(self.output(history, 4), "y = 1\n") # other path
+        self.assertEqual(self.output(history, 6), "z = 1\n") # other range
+        self.assertEqual(self.output(history, 8), "x = 2\n")
+
+    def test_identical_output_is_elided(self):
+        history = self.history(
+            ("run_python_file", {"file_path": "tests.py"}, "1 failed"),
+            ("run_python_file", {"file_path": "tests.py"}, "1 failed"),
+            ("get_files_info", {"directory": "."}, "1 failed"),
+        )
+        self.assertEqual(self.compact(history), 1)
+        self.assertTrue(self.output(history, 2).startswith("[Elided: identical to a later result"))
+        self.assertEqual(self.output(history, 4), "1 failed")
+        self.assertEqual(self.output(history, 6), "1 failed") # same text from another function
+
+    def test_budget_summarizes_oldest_large_outputs(self):
+        large = "first line\n" + "x" * 4000
+        history = self.history(
+            ("run_python_file", {"file_path": "a.py"}, large + "a"),
+            ("run_python_file", {"file_path": "b.py"}, "small"),
+            ("run_python_file", {"file_path": "c.py"}, large + "c"),
+        )
+        budget = estimate_prompt_tokens(history) - 100 # met once the oldest large output is summarized
+        self.assertEqual(self.compact(history, token_budget=budget), 1)
+        self.assertEqual(
+            self.output(history, 2),
+            f'[Elided: {len(large) + 1} characters of run_python_file output removed to save tokens; first line: "first line"]',
+        )
+        self.assertEqual(self.output(history, 4), "small")
+        self.assertEqual(self.output(history, 6), large + "c")
+        self.assertLessEqual(estimate_prompt_tokens(history), budget)
+
+    def test_keep_recent_contents_are_not_compacted(self):
+        large = "x" * 4000
+        history = self.history(
+            ("get_file_content", {"file_path": "a.py"}, large),
+            ("get_file_content", {"file_path": "a.py"}, large),
+        )
+        self.assertEqual(self.compact(history, token_budget=1, keep_recent=4), 0)
+        self.assertEqual(self.output(history, 2), large)
+        self.assertEqual(self.compact(history, token_budget=1, keep_recent=2), 1)
+        self.assertTrue(self.output(history, 2).startswith("[Elided: superseded"))
+        self.assertEqual(self.output(history, 4), large) # within keep_recent, even over budget
+
+
+class TestToolCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=os.path.join(root_dir(), "calculator"))
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.working_directory = os.path.relpath(self.directory, root_dir())
+        self.path = os.path.join(self.directory, "a.txt")
+        with open(self.path, "w") as f:
+            f.write("a")
+        tool_cache.clear()
+        self.addCleanup(tool_cache.clear)
+
+    def call(self, name: str, function, **args) -> str:
+        return call_cached(name, {"working_directory": self.working_directory, **args}, function)
+
+    def test_file_content_is_served_until_the_file_changes(self):
+        self.assertEqual(self.call("get_file_content", get_file_content, file_path="a.txt"), "a")
+        self.assertEqual(self.call("get_file_content", get_file_content, file_path="a.txt"), "a")
+        self.assertEqual(tool_cache.stats()["hits"], 1)
+        with open(self.path, "a") as f:
+            f.write("bcdefgh")
+        self.assertEqual(self.call("get_file_content", get_file_content, file_path="a.txt"), "abcdefgh")
+
+    def test_listing_reports_files_that_grew(self):
+        self.assertIn("a.txt: file_size=1 bytes", self.call("get_files_info", get_files_info))
+        with open(self.path, "a") as f:
+            f.write("bcdefgh")
+        self.assertIn("a.txt: file_size=8 bytes", self.call("get_files_info", get_files_info))
+
+
+
+class TestCallFunctions(unittest.TestCase):
+    def setUp(self):
+        self.events: list[tuple[str, str]] = []
+        self.lock = threading.Lock()
+        fake_functions = {name: self.slow_function(name) for name in ("get_file_content", "write_file")}
+        patches = [
+            mock.patch.object(call_function_module, "map_to_function", fake_functions),
+            mock.patch.object(call_function_module, "call_cached", lambda name, args, function: function(**args)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def slow_function(self, name: str):
+        def function(working_directory: str, file_path: str, delay: float) -> str:
+            with self.lock:
+                self.events.append(("start", file_path))
+            time.sleep(delay)
+            with self.lock:
+                self.events.append(("end", file_path))
+            return f"{name} {file_path}"
+        return function
+
+    def calls(self, *specs: tuple[str, str, float]) -> list[types.FunctionCall]:
+        return [types.FunctionCall(name=name, args={"file_path": path, "delay": delay}) for name, path, delay in specs]
+
+    def dispatch(self, function_calls: list[types.FunctionCall], streaming: bool) -> list[str]:
+        """Run the calls through call_functions or StreamingDispatcher and return the result texts."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            if streaming:
+                dispatcher = StreamingDispatcher(max_workers=4)
+                for function_call in function_calls:
+                    dispatcher.submit(function_call)
+                contents = dispatcher.results()
+            else:
+                contents = call_functions(function_calls, max_workers=4)
+        return [content.parts[0].function_response.response["result"] for content in contents]
+
+    def position(self, event: str, path: str) -> int:
+        return self.events.index((event, path))
+
+    def test_results_keep_model_order(self):
+        for streaming in (False, True):
+            self.events.clear()
+            with self.subTest(streaming=streaming):
+                results = self.dispatch(self.calls(
+                    ("get_file_content", "a", 0.3),
+                    ("get_file_content", "b", 0.2),
+                    ("get_file_content", "c", 0.1),
+                ), streaming)
+                self.assertEqual(results, ["get_file_content a", "get_file_content b", "get_file_content c"])
+                # The reads ran concurrently: the last one requested finished first
+                self.assertEqual([path for event, path in self.events if event == "end"], ["c", "b", "a"])
+
+    def test_writes_are_barriers(self):
+        for name in ("write_file", "write_files"):
+            for streaming in (False, True):
+                self.events.clear()
+                with self.subTest(name=name, streaming=streaming):
+                    write_function = call_function_module.map_to_function["write_file"]
+                    with mock.patch.dict(call_function_module.map_to_function, {name: write_function}):
+                        results = self.dispatch(self.calls(
+                            ("get_file_content", "a", 0.2),
+                            ("get_file_content", "b", 0.1),
+                            (name, "w", 0.1),
+                            ("get_file_content", "c", 0.01),
+                        ), streaming)
+                    self.assertEqual(results, [
+                        "get_file_content a", "get_file_content b", "write_file w", "get_file_content c",
+                    ])
+                    self.assertGreater(self.position("start", "w"), self.position("end", "a"))
+                    self.assertGreater(self.position("start", "w"), self.position("end", "b"))
+                    self.assertGreater(self.position("start", "c"), self.position("end", "w"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import os
 from functions.get_files_info import get_files_info
+from functions.get_file_content import get_file_content
 
 
 def test():
@@ -19,7 +20,39 @@ def test():
     result = get_files_info("calculator", "../")
     print("Result for '../' directory:")
     print(result)
+    print("")
+
+    result = get_files_info("calculator", ".", recursive=True, pattern="*.py")
+    print("Result for Python files in current directory (recursive):")
+    print(result)
+    print("")
+
+    result = get_files_info("calculator", ".", sort="size", limit=2)
+    print("Result for two largest entries in current directory:")
+    print(result)
+
+
+def test_get_file_content():
+    result = get_file_content("calculator", "main.py", length=100)
+    print("Result for first 100 bytes of 'main.py':")
+    print(result)
+    print("")
+
+    result = get_file_content("calculator", "main.py", offset=100, length=100)
+    print("Result for next 100 bytes of 'main.py':")
+    print(result)
+    print("")
+
+    result = get_file_content("calculator", "pkg/calculator.py", start_line=1, end_line=5)
+    print("Result for lines 1-5 of 'pkg/calculator.py':")
+    print(result)
+    print("")
+
+    result = get_file_content("calculator", "/bin/cat")
+    print("Result for '/bin/cat' file:")
+    print(result)
 
 
 if __name__ == "__main__":
     test()
+    test_get_file_content()
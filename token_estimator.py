@@ -0,0 +1,137 @@
+from __future__ import annotations
+import os
+import json
+import weakref
+import threading
+from config import env_str, lazy_module
+
+
+types = lazy_module("google.genai.types") # only needed for annotations
+TOKEN_CALIBRATION_FILE = env_str("TOKEN_CALIBRATION_FILE", os.path.join(".cache", "token_calibration.json"))
+
+# Rough average for Gemini tokenizers on English text and code, before calibration
+CHARS_PER_TOKEN = 4
+# Weight of each new measurement in the calibration factor, and the range the factor is kept in
+CALIBRATION_WEIGHT = 0.2
+MIN_FACTOR = 0.25
+MAX_FACTOR = 4.0
+
+# Character counts of parts and configs already measured, keyed by object id. Parts are replaced rather than
+# changed in place (e.g., by history compaction), so an entry stays valid for as long as its object is alive
+_sizes: dict[int, tuple[weakref.ref, int]] = {}
+_factor: float | None = None # calibrated tokens per uncalibrated estimate, loaded on first use
+_lock = threading.Lock()
+
+
+def _memoized_size(obj, measure) -> int:
+    key = id(obj)
+    entry = _sizes.get(key)
+    if entry is not None and entry[0]() is obj:
+        return entry[1]
+    size = measure(obj)
+
+    def forget(ref: weakref.ref, key: int=key) -> None:
+        if _sizes.get(key, (None,))[0] is ref:
+            del _sizes[key]
+
+    _sizes[key] = (weakref.ref(obj, forget), size)
+    return size
+
+
+def _measure_part(part: types.Part) -> int:
+    chars = 0
+    if part.text:
+        chars += len(part.text)
+    if part.function_call:
+        chars += len(part.function_call.name or "") + len(json.dumps(part.function_call.args or {}))
+    if part.function_response:
+        chars += len(part.function_response.name or "") + len(json.dumps(part.function_response.response or {}))
+    return chars
+
+
+def _measure_config(config: types.GenerateContentConfig) -> int:
+    chars = 0
+    if isinstance(config.system_instruction, str):
+        chars += len(config.system_instruction)
+    for tool in config.tools or []:
+        chars += len(tool.model_dump_json(exclude_none=True))
+    return chars
+
+
+def count_chars(
+    conversation_history: list[types.Content],
+    config: types.GenerateContentConfig | None = None
+) -> int:
+    """Return the number of characters a request sends, measuring each part and config only once."""
+    chars = 0
+    for content in conversation_history:
+        for part in content.parts or []:
+            chars += _memoized_size(part, _measure_part)
+    if config is not None:
+        chars += _memoized_size(config, _measure_config)
+    return chars
+
+
+def calibration_factor() -> float:
+    """Return the ratio of reported to estimated prompt tokens, learned from earlier requests (1.0 at first)."""
+    global _factor
+    if _factor is None:
+        try:
+            with open(TOKEN_CALIBRATION_FILE, "r", encoding="utf-8") as f:
+                _factor = min(MAX_FACTOR, max(MIN_FACTOR, float(json.load(f)["factor"])))
+        except (OSError, ValueError, KeyError, TypeError):
+            _factor = 1.0
+    return _factor
+
+
+def tokens_for_chars(chars: int, calibrated: bool=True) -> int:
+    """Convert a character count to an estimated number of tokens."""
+    tokens = chars / CHARS_PER_TOKEN
+    if calibrated:
+        tokens *= calibration_factor()
+    return int(tokens)
+
+
+def estimate_prompt_tokens(
+    conversation_history: list[types.Content],
+    config: types.GenerateContentConfig | None = None,
+    calibrated: bool=True,
+) -> int:
+    '''
+    Estimates the prompt tokens of an upcoming request offline, from the size of its contents. Parts are measured
+    once, so estimating a history that grew by one tool result only measures the new result.
+
+    Args:
+        conversation_history: Contents that will be sent to the model
+        config: Optional model configuration; its system prompt and tool schemas are also sent
+        calibrated: Scale the estimate by the calibration factor learned from reported token counts
+    Returns:
+        Approximate number of input tokens.
+    '''
+    return tokens_for_chars(count_chars(conversation_history, config), calibrated) + 1
+
+
+def calibrate(estimated_tokens: int, actual_tokens: int) -> None:
+    '''
+    Moves the calibration factor toward the prompt_token_count reported for a request and saves it, so later
+    estimates (in this and future runs) track the real tokenizer.
+
+    Args:
+        estimated_tokens: Calibrated estimate made before the request
+        actual_tokens: prompt_token_count from the response's usage_metadata
+    '''
+    global _factor
+    if estimated_tokens <= 0 or actual_tokens <= 0:
+        return
+    with _lock:
+        ratio = min(MAX_FACTOR, max(MIN_FACTOR, actual_tokens / estimated_tokens))
+        factor = calibration_factor() * (1 - CALIBRATION_WEIGHT + CALIBRATION_WEIGHT * ratio)
+        _factor = min(MAX_FACTOR, max(MIN_FACTOR, factor))
+        try:
+            os.makedirs(os.path.dirname(TOKEN_CALIBRATION_FILE) or ".", exist_ok=True)
+            temp_path = f"{TOKEN_CALIBRATION_FILE}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"factor": _factor}, f)
+            os.replace(temp_path, TOKEN_CALIBRATION_FILE)
+        except OSError:
+            pass # calibration still applies to this process
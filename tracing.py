@@ -0,0 +1,124 @@
+import json
+import math
+import time
+import threading
+from config import env_str
+
+
+# Opt-in: spans are only recorded when TRACE_FILE is set (or tracing is enabled with --trace)
+TRACE_FILE = env_str("TRACE_FILE", "")
+DEFAULT_TRACE_FILE = "trace.jsonl"
+
+_trace_file = TRACE_FILE or None
+_durations: dict[str, list[float]] = {} # span name -> durations in milliseconds, for the summary
+_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    """Return True if spans are being recorded."""
+    return _trace_file is not None
+
+
+def enable(trace_file: str | None=None) -> None:
+    """Start recording spans to trace_file (default: TRACE_FILE, or trace.jsonl)."""
+    global _trace_file
+    _trace_file = trace_file or TRACE_FILE or DEFAULT_TRACE_FILE
+
+
+class Span:
+    '''
+    Context manager that times a block and appends one JSONL event to the trace file:
+    {"name": ..., "start": <unix time>, "duration_ms": ..., "thread": ..., **attributes}.
+    The dictionary returned on entry can be filled with attributes known only at the end (e.g., bytes read).
+    When tracing is disabled, nothing is recorded.
+
+    Example:
+        with span("tool.get_file_content", file_path=path) as attributes:
+            attributes["bytes"] = len(data)
+    '''
+
+    __slots__ = ("name", "attributes", "start", "start_time")
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> dict:
+        if _trace_file is not None:
+            self.start_time = time.time()
+            self.start = time.perf_counter()
+        return self.attributes
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if _trace_file is None or not hasattr(self, "start"):
+            return
+        duration_ms = (time.perf_counter() - self.start) * 1000
+        event = {
+            "name": self.name,
+            "start": round(self.start_time, 6),
+            "duration_ms": round(duration_ms, 3),
+            "thread": threading.current_thread().name,
+            **self.attributes,
+        }
+        if exc_type is not None:
+            event["error"] = exc_type.__name__
+        _record(event)
+
+
+def span(name: str, **attributes) -> Span:
+    """Return a Span for a block of work; see Span."""
+    return Span(name, **attributes)
+
+
+def _record(event: dict) -> None:
+    line = json.dumps(event, default=str) + "\n"
+    with _lock:
+        _durations.setdefault(event["name"], []).append(event["duration_ms"])
+        try:
+            with open(_trace_file, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError:
+            pass # tracing must never break the agent
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def summary() -> list[dict]:
+    '''
+    Returns per-span statistics for the spans recorded by this process, slowest total first.
+
+    Returns:
+        List of {"name", "count", "total_ms", "p50_ms", "p95_ms", "max_ms"} dictionaries.
+    '''
+    with _lock:
+        durations = {name: sorted(values) for name, values in _durations.items()}
+    rows = [
+        {
+            "name": name,
+            "count": len(values),
+            "total_ms": sum(values),
+            "p50_ms": _percentile(values, 0.50),
+            "p95_ms": _percentile(values, 0.95),
+            "max_ms": values[-1],
+        }
+        for name, values in durations.items()
+    ]
+    return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+
+def print_summary() -> None:
+    """Print the summary table of recorded spans."""
+    rows = summary()
+    if not rows:
+        return
+    width = max(len("span"), *(len(row["name"]) for row in rows))
+    print(f"\nTrace summary (events in {_trace_file}):")
+    print(f"{'span':<{width}}  {'count':>6}  {'total ms':>10}  {'p50 ms':>9}  {'p95 ms':>9}  {'max ms':>9}")
+    for row in rows:
+        print(
+            f"{row['name']:<{width}}  {row['count']:>6}  {row['total_ms']:>10.1f}  "
+            f"{row['p50_ms']:>9.1f}  {row['p95_ms']:>9.1f}  {row['max_ms']:>9.1f}"
+        )